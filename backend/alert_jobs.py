@@ -0,0 +1,263 @@
+"""
+Automatic alert jobs for SISMOBI 3.2.0
+
+Generated alerts are persisted with a single ``bulk_write`` of upserts keyed
+on ``(property_id, tenant_id, type, month)``, so re-running a job for the
+same month updates the existing alerts instead of duplicating them.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import uuid
+
+import structlog
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from config import settings
+from rollups import record_pending_alerts_delta
+from utils import (
+    ALERT_PRIORITY_SCORES, generate_automatic_alerts, get_priority_score, invalidate_count_cache
+)
+
+logger = structlog.get_logger(__name__)
+
+# Bill alerts have no tenant, so the property is part of the key
+ALERT_DEDUP_FIELDS = ("property_id", "tenant_id", "type", "month")
+ALERT_DEDUP_INDEX = "alerts_property_dedup_key"
+LEGACY_ALERT_DEDUP_INDEX = "alerts_dedup_key"
+INDEX_NOT_FOUND = 27
+# id breaks ties so skip/limit pages of equal-priority alerts are stable
+ALERT_LIST_SORT = [("resolved", 1), ("priority_score", 1), ("created_at", -1), ("id", 1)]
+ALERT_LIST_INDEX = "alerts_list_order_by_id"
+LEGACY_ALERT_LIST_INDEX = "alerts_list_order"
+
+# Bill collections checked for consumption anomalies
+CONSUMPTION_SOURCES = {
+    "energy_bills": {"type": "high_energy_bill", "consumption": "total_kwh", "label": "Energy", "unit": "kWh"},
+    "water_bills": {"type": "high_water_bill", "consumption": "total_liters", "label": "Water", "unit": "L"},
+}
+# A property needs this many baseline months before it can be flagged, and
+# an anomaly must also be this far above the mean, so steady bills with a
+# near-zero standard deviation are not flagged for small rises
+MIN_BASELINE_MONTHS = 3
+MIN_INCREASE_RATIO = 0.2
+HIGH_PRIORITY_INCREASE_RATIO = 0.5
+
+# Fields only written when the alert is first created, so a re-run never
+# reopens an alert that someone already resolved
+INSERT_ONLY_FIELDS = ("created_at", "resolved", "resolved_at")
+
+def priority_score_expression() -> Dict[str, Any]:
+    """Aggregation expression computing priority_score from the stored priority"""
+    branches = [
+        {"case": {"$eq": ["$priority", priority]}, "then": score}
+        for priority, score in ALERT_PRIORITY_SCORES.items()
+    ]
+    return {"$switch": {"branches": branches, "default": get_priority_score(None)}}
+
+async def backfill_alert_priority_scores(db: AsyncIOMotorDatabase) -> int:
+    """Store priority_score on alerts written before it existed"""
+    result = await db.alerts.update_many(
+        {"priority_score": {"$exists": False}},
+        [{"$set": {"priority_score": priority_score_expression()}}]
+    )
+    if result.modified_count:
+        logger.info("Alert priority scores backfilled", count=result.modified_count)
+    return result.modified_count
+
+def build_alert_upsert(alert: Dict[str, Any]) -> UpdateOne:
+    """Upsert operation for one generated alert"""
+    alert = {"resolved": False, "resolved_at": None, **alert}
+    alert["priority_score"] = get_priority_score(alert.get("priority"))
+    alert.setdefault("month", alert["created_at"].strftime("%Y-%m"))
+    key = {field: alert.get(field) for field in ALERT_DEDUP_FIELDS}
+    on_insert = {field: alert[field] for field in INSERT_ONLY_FIELDS}
+    on_insert["id"] = str(uuid.uuid4())
+    updates = {
+        field: value for field, value in alert.items()
+        if field not in INSERT_ONLY_FIELDS and field not in key
+    }
+    return UpdateOne(key, {"$set": updates, "$setOnInsert": on_insert}, upsert=True)
+
+async def persist_generated_alerts(db: AsyncIOMotorDatabase, alerts: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Write generated alerts in one round trip; returns inserted/updated counts"""
+    if not alerts:
+        return {"inserted": 0, "updated": 0}
+
+    operations = [build_alert_upsert(alert) for alert in alerts]
+    try:
+        result = await db.alerts.bulk_write(operations, ordered=False)
+        inserted, updated = result.upserted_count, result.matched_count
+    except BulkWriteError as e:
+        # A concurrent run may win the race on the unique index; its alert
+        # already exists, so duplicate-key failures count as updates
+        details = e.details
+        duplicates = [error for error in details.get("writeErrors", []) if error.get("code") == 11000]
+        if len(duplicates) != len(details.get("writeErrors", [])):
+            raise
+        inserted, updated = details.get("nUpserted", 0), details.get("nMatched", 0) + len(duplicates)
+
+    if inserted:
+        invalidate_count_cache("alerts")
+        await record_pending_alerts_delta(db, inserted)
+
+    logger.info("Generated alerts persisted", inserted=inserted, updated=updated)
+    return {"inserted": inserted, "updated": updated}
+
+async def run_automatic_alerts(db: AsyncIOMotorDatabase) -> Dict[str, int]:
+    """Generate rent alerts and persist them idempotently"""
+    alerts = await generate_automatic_alerts(db)
+    result = await persist_generated_alerts(db, alerts)
+    return {"generated": len(alerts), **result}
+
+async def _drop_alert_index(db: AsyncIOMotorDatabase, name: str) -> bool:
+    """Drop an alerts index if it exists; returns whether this call dropped it"""
+    existing = {info["name"] async for info in db.alerts.list_indexes()}
+    if name not in existing:
+        return False
+    try:
+        await db.alerts.drop_index(name)
+    except OperationFailure as e:
+        # Another worker running the same migration dropped it first
+        if e.code != INDEX_NOT_FOUND:
+            raise
+        return False
+    return True
+
+async def drop_legacy_alert_dedup_index(db: AsyncIOMotorDatabase) -> bool:
+    """Drop the dedup index keyed without property_id
+
+    Its replacement is created by ``ensure_indexes`` under a new name; while
+    the old one exists, bill alerts of different properties collide on it.
+    """
+    return await _drop_alert_index(db, LEGACY_ALERT_DEDUP_INDEX)
+
+async def drop_legacy_alert_list_index(db: AsyncIOMotorDatabase) -> bool:
+    """Drop the list order index without the id tiebreaker
+
+    ``ensure_indexes`` creates its replacement under a new name, since an
+    index cannot be redefined under the same one.
+    """
+    return await _drop_alert_index(db, LEGACY_ALERT_LIST_INDEX)
+
+def _bill_period_stages(source: str, first_period: int, period: int) -> List[Dict[str, Any]]:
+    """Bills of one collection within the window, as (source, property, period) rows"""
+    return [
+        # Whole years first so the (year, month) index narrows the scan
+        {"$match": {"year": {"$gte": first_period // 12, "$lte": period // 12}}},
+        {
+            "$project": {
+                "_id": 0,
+                "source": {"$literal": source},
+                "property_id": 1,
+                "period": {"$add": [{"$multiply": ["$year", 12]}, {"$subtract": ["$month", 1]}]},
+                "consumption": f"${CONSUMPTION_SOURCES[source]['consumption']}",
+                "amount": "$total_amount",
+            }
+        },
+        {"$match": {"period": {"$gte": first_period, "$lte": period}}},
+    ]
+
+def build_consumption_baseline_pipeline(
+    year: int,
+    month: int,
+    baseline_months: int,
+    stddevs: float
+) -> List[Dict[str, Any]]:
+    """Properties whose consumption in a month is anomalous, for every bill type
+
+    Runs over ``energy_bills`` with the water bills pulled in by
+    ``$unionWith``. Group bills are summed per property and month, then each
+    property's month is compared with the mean and standard deviation of its
+    previous ``baseline_months`` months. Only anomalies are returned.
+    """
+    period = year * 12 + month - 1
+    first_period = period - baseline_months
+    is_current = {"$eq": ["$_id.period", period]}
+    in_baseline = {"$lt": ["$_id.period", period]}
+    return [
+        *_bill_period_stages("energy_bills", first_period, period),
+        {"$unionWith": {"coll": "water_bills", "pipeline": _bill_period_stages("water_bills", first_period, period)}},
+        {
+            "$group": {
+                "_id": {"source": "$source", "property_id": "$property_id", "period": "$period"},
+                "consumption": {"$sum": "$consumption"},
+                "amount": {"$sum": "$amount"},
+            }
+        },
+        {
+            "$group": {
+                "_id": {"source": "$_id.source", "property_id": "$_id.property_id"},
+                "current_consumption": {"$sum": {"$cond": [is_current, "$consumption", 0]}},
+                "current_amount": {"$sum": {"$cond": [is_current, "$amount", 0]}},
+                "has_current": {"$max": is_current},
+                # $avg and $stdDevPop ignore the nulls of months outside the baseline
+                "baseline_mean": {"$avg": {"$cond": [in_baseline, "$consumption", None]}},
+                "baseline_stddev": {"$stdDevPop": {"$cond": [in_baseline, "$consumption", None]}},
+                "baseline_months": {"$sum": {"$cond": [in_baseline, 1, 0]}},
+            }
+        },
+        {"$match": {"has_current": True, "baseline_months": {"$gte": MIN_BASELINE_MONTHS}}},
+        {
+            "$match": {
+                "$expr": {
+                    "$gt": [
+                        "$current_consumption",
+                        {"$max": [
+                            {"$add": ["$baseline_mean", {"$multiply": [stddevs, "$baseline_stddev"]}]},
+                            {"$multiply": ["$baseline_mean", 1 + MIN_INCREASE_RATIO]},
+                        ]},
+                    ]
+                }
+            }
+        },
+    ]
+
+async def generate_consumption_alerts(
+    db: AsyncIOMotorDatabase,
+    year: int,
+    month: int,
+    baseline_months: Optional[int] = None,
+    stddevs: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """high_energy_bill / high_water_bill alerts for one month, portfolio-wide"""
+    baseline_months = baseline_months or settings.consumption_baseline_months
+    stddevs = settings.consumption_anomaly_stddevs if stddevs is None else stddevs
+    pipeline = build_consumption_baseline_pipeline(year, month, baseline_months, stddevs)
+
+    now = datetime.now()
+    alerts: List[Dict[str, Any]] = []
+    async for anomaly in db.energy_bills.aggregate(pipeline):
+        source = CONSUMPTION_SOURCES[anomaly["_id"]["source"]]
+        mean = anomaly["baseline_mean"]
+        increase = anomaly["current_consumption"] / mean - 1 if mean else 0.0
+        alerts.append({
+            "property_id": anomaly["_id"]["property_id"],
+            "tenant_id": None,
+            "title": f"High {source['label'].lower()} bill",
+            "message": (
+                f"{source['label']} consumption of {anomaly['current_consumption']:.0f} {source['unit']} "
+                f"in {month:02d}/{year} is {increase:.0%} above the {anomaly['baseline_months']}-month "
+                f"average of {mean:.0f} {source['unit']} (bill total {anomaly['current_amount']:.2f})"
+            ),
+            "type": source["type"],
+            "priority": "high" if increase >= HIGH_PRIORITY_INCREASE_RATIO else "medium",
+            "month": f"{year:04d}-{month:02d}",
+            "created_at": now,
+            "updated_at": now
+        })
+
+    logger.info("Consumption anomalies detected", year=year, month=month, count=len(alerts))
+    return alerts
+
+async def run_consumption_alerts(
+    db: AsyncIOMotorDatabase,
+    year: Optional[int] = None,
+    month: Optional[int] = None
+) -> Dict[str, int]:
+    """Detect consumption anomalies for a month (default: the current one) and persist them"""
+    now = datetime.now()
+    alerts = await generate_consumption_alerts(db, year or now.year, month or now.month)
+    result = await persist_generated_alerts(db, alerts)
+    return {"generated": len(alerts), **result}
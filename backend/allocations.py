@@ -0,0 +1,127 @@
+"""
+Utility bill allocation engine for SISMOBI 3.2.0
+
+Server-side ports of ``distributeEnergyGroupBill`` and
+``distributeWaterGroupBill`` (src/utils/energyCalculations.ts,
+waterCalculations.ts).
+
+Energy: a group bill is split at ``total_amount / total_kwh`` per kWh; every
+metered recipient pays for its own consumption and the group's residual
+receiver pays for whatever the meters did not record, absorbing the cent
+rounding so allocations add up to the bill exactly.
+
+Water: a group bill is split per person.
+
+All bills passed in are computed together as flat NumPy arrays, so a whole
+billing run costs a handful of array operations instead of a Python loop
+per group.
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+def has_energy_allocation_inputs(bill: Dict[str, Any]) -> bool:
+    return bool(bill.get("meter_consumptions") or bill.get("residual_receiver"))
+
+def validate_people_counts(people_counts: Dict[str, int]) -> Optional[str]:
+    """Port of ``validatePeopleData``: every recipient needs at least one person"""
+    missing = [recipient for recipient, people in people_counts.items() if people <= 0]
+    if missing:
+        return f"Number of people missing for: {', '.join(missing)}"
+    return None
+
+def allocate_energy_bills(bills: List[Dict[str, Any]]) -> List[Dict[str, float]]:
+    """``tenant_allocations`` for each bill, in order
+
+    Each bill needs ``total_amount``, ``total_kwh``, ``meter_consumptions``
+    (recipient -> kWh) and optionally ``residual_receiver``. A residual
+    receiver that also has a meter pays for both.
+    """
+    bill_count = len(bills)
+    if bill_count == 0:
+        return []
+
+    totals = np.array([bill.get("total_amount") or 0.0 for bill in bills], dtype=float)
+    total_kwh = np.array([bill.get("total_kwh") or 0.0 for bill in bills], dtype=float)
+
+    meters = [(bill.get("meter_consumptions") or {}) for bill in bills]
+    meter_counts = np.fromiter((len(readings) for readings in meters), dtype=np.int64, count=bill_count)
+    bill_index = np.repeat(np.arange(bill_count), meter_counts)
+    consumption = np.fromiter(
+        (kwh for readings in meters for kwh in readings.values()), dtype=float, count=int(meter_counts.sum())
+    )
+
+    # Bills without consumption or value allocate nothing, as in the frontend
+    rate = np.divide(totals, total_kwh, out=np.zeros(bill_count), where=(total_kwh > 0) & (totals > 0))
+    metered_values = np.round(consumption * rate[bill_index], 2)
+    metered_totals = np.bincount(bill_index, weights=metered_values, minlength=bill_count)
+
+    has_receiver = np.array([bool(bill.get("residual_receiver")) for bill in bills])
+    billable = rate > 0
+    residuals = np.where(has_receiver & billable, np.round(totals - metered_totals, 2), 0.0)
+
+    allocations: List[Dict[str, float]] = []
+    offset = 0
+    for position, bill in enumerate(bills):
+        count = int(meter_counts[position])
+        values = metered_values[offset:offset + count].tolist()
+        allocation = dict(zip(meters[position].keys(), values))
+        offset += count
+
+        receiver = bill.get("residual_receiver")
+        if receiver:
+            allocation[receiver] = round(allocation.get(receiver, 0.0) + float(residuals[position]), 2)
+        allocations.append(allocation)
+    return allocations
+
+def allocate_water_bills(bills: List[Dict[str, Any]]) -> List[Dict[str, float]]:
+    """``tenant_allocations`` for each bill, in order
+
+    Port of ``distributeWaterGroupBill``: each bill needs ``total_amount`` and
+    ``people_counts`` (recipient -> people) and is split per person. Shares
+    are computed in integer cents and leftover cents go to the largest
+    fractional remainders, so every bill's allocations sum to its total.
+    """
+    bill_count = len(bills)
+    if bill_count == 0:
+        return []
+
+    total_cents = np.rint(
+        np.array([bill.get("total_amount") or 0.0 for bill in bills], dtype=float) * 100
+    ).astype(np.int64)
+
+    counts = [(bill.get("people_counts") or {}) for bill in bills]
+    entry_counts = np.fromiter((len(people) for people in counts), dtype=np.int64, count=bill_count)
+    entry_total = int(entry_counts.sum())
+    bill_index = np.repeat(np.arange(bill_count), entry_counts)
+    people = np.fromiter(
+        (number for people_counts in counts for number in people_counts.values()), dtype=np.int64, count=entry_total
+    )
+
+    total_people = np.bincount(bill_index, weights=people, minlength=bill_count).astype(np.int64)
+    # Bills without value or people allocate nothing, as in the frontend
+    divisor = np.where(total_people > 0, total_people, 1)
+    billable = (total_people > 0)[bill_index]
+    numerators = np.where(billable, total_cents[bill_index] * people, 0)
+
+    cents = numerators // divisor[bill_index]
+    remainders = numerators % divisor[bill_index]
+    leftover = total_cents - np.bincount(bill_index, weights=cents, minlength=bill_count).astype(np.int64)
+    leftover = np.where(total_people > 0, leftover, 0)
+
+    # Rank entries within their bill by remainder (largest first, then input
+    # order) and give one extra cent to the first ``leftover`` of them
+    order = np.lexsort((np.arange(entry_total), -remainders, bill_index))
+    first_entry = np.concatenate(([0], np.cumsum(entry_counts)[:-1]))
+    rank = np.empty(entry_total, dtype=np.int64)
+    rank[order] = np.arange(entry_total) - first_entry[bill_index[order]]
+    cents = cents + (rank < leftover[bill_index])
+
+    values = (cents / 100).tolist()
+    allocations: List[Dict[str, float]] = []
+    offset = 0
+    for position in range(bill_count):
+        count = int(entry_counts[position])
+        allocations.append(dict(zip(counts[position].keys(), values[offset:offset + count])))
+        offset += count
+    return allocations
@@ -1,27 +1,50 @@
 """
 Authentication utilities for SISMOBI 3.2.0
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import secrets
+import time
+import uuid
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 import structlog
 
+from cache import TTLCache
 from config import settings
 from database import get_database
-from models import User, TokenData
+from models import User, TokenData, UserUpdate
 
 logger = structlog.get_logger(__name__)
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is CPU-bound (~250ms per call); it runs on a small dedicated pool so
+# a burst of logins queues there instead of blocking the event loop
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers,
+    thread_name_prefix="password-hash"
+)
+_password_hash_stats = {"in_flight": 0, "peak_queued": 0, "completed": 0, "rejected": 0}
+
 # Token security
 security = HTTPBearer()
 
+# Authenticated users by email. Per process: a change made elsewhere is seen
+# here once the entry expires, so keep the TTL short.
+_user_cache = TTLCache(
+    max_size=settings.user_cache_max_size,
+    ttl_seconds=settings.user_cache_ttl_seconds
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -30,6 +53,67 @@ def get_password_hash(password: str) -> str:
     """Generate password hash"""
     return pwd_context.hash(password)
 
+class PasswordHashingBusyError(Exception):
+    """Raised when too many password operations are already pending"""
+
+async def _run_password_operation(func: Callable[..., Any], *args: Any) -> Any:
+    """Run a bcrypt operation on the password pool, tracking queue depth
+
+    Fails fast with ``PasswordHashingBusyError`` once
+    ``max_pending_password_hashes`` operations are in flight, so a flood of
+    logins is rejected instead of queueing without bound.
+    """
+    stats = _password_hash_stats
+    if stats["in_flight"] >= settings.max_pending_password_hashes:
+        stats["rejected"] += 1
+        raise PasswordHashingBusyError()
+    stats["in_flight"] += 1
+    queued = max(stats["in_flight"] - settings.password_hash_workers, 0)
+    if queued > stats["peak_queued"]:
+        stats["peak_queued"] = queued
+    if queued and queued >= settings.password_hash_workers * 4:
+        logger.warning("Password hashing queue is backing up", queued=queued)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+    finally:
+        stats["in_flight"] -= 1
+        stats["completed"] += 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the password hashing pool"""
+    return await _run_password_operation(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Generate a password hash on the password hashing pool"""
+    return await _run_password_operation(get_password_hash, password)
+
+def get_password_hashing_stats() -> Dict[str, int]:
+    """Current load of the password hashing pool"""
+    in_flight = _password_hash_stats["in_flight"]
+    return {
+        "workers": settings.password_hash_workers,
+        "in_flight": in_flight,
+        "queued": max(in_flight - settings.password_hash_workers, 0),
+        "peak_queued": _password_hash_stats["peak_queued"],
+        "completed": _password_hash_stats["completed"],
+        "rejected": _password_hash_stats["rejected"],
+        "max_pending": settings.max_pending_password_hashes,
+    }
+
+def build_access_token_claims(user: User) -> dict:
+    """Claims carried by access tokens
+
+    Besides the subject, tokens carry what ``get_current_user`` needs to
+    accept them without a database lookup in stateless mode.
+    """
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "name": user.full_name,
+        "active": user.is_active,
+        "ver": user.token_version,
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -53,12 +137,174 @@ async def get_user_by_email(db: AsyncIOMotorDatabase, email: str) -> Optional[Us
         logger.error("Error getting user by email", email=email, error=str(e))
         return None
 
+async def get_user_by_id(db: AsyncIOMotorDatabase, user_id: str) -> Optional[User]:
+    """Get user by id from database"""
+    try:
+        user_data = await db.users.find_one({"id": user_id})
+        if user_data:
+            return User(**user_data)
+        return None
+    except Exception as e:
+        logger.error("Error getting user by id", user_id=user_id, error=str(e))
+        return None
+
+async def get_cached_user_by_email(db: AsyncIOMotorDatabase, email: str) -> Optional[User]:
+    """Get user by email, served from the in-process user cache when fresh"""
+    user = _user_cache.get(email)
+    if user is None:
+        user = await get_user_by_email(db, email)
+        if user is not None:
+            _user_cache.set(email, user)
+    return user
+
+def invalidate_user_cache(email: Optional[str] = None) -> None:
+    """Drop a cached user (or every cached user when no email is given)"""
+    if email is None:
+        _user_cache.clear()
+    else:
+        _user_cache.invalidate(email)
+
+class TokenRevocationRegistry:
+    """In-memory copy of ``token_revocations``: minimum valid token version per user id
+
+    Refreshed from MongoDB at most once per ``token_revocation_refresh_seconds``
+    by whichever request first finds it stale.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._min_versions: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds
+
+    async def refresh(self, db: AsyncIOMotorDatabase) -> None:
+        min_versions = {}
+        async for record in db.token_revocations.find({}, {"_id": 1, "min_version": 1}):
+            min_versions[record["_id"]] = record.get("min_version", 0)
+        self._min_versions = min_versions
+        self._loaded_at = time.monotonic()
+
+    async def refresh_if_stale(self, db: AsyncIOMotorDatabase) -> None:
+        if not self.is_stale():
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.is_stale():
+                await self.refresh(db)
+
+    def revoke(self, user_id: str, min_version: int) -> None:
+        """Apply a revocation locally without waiting for the next refresh"""
+        self._min_versions[user_id] = max(self._min_versions.get(user_id, 0), min_version)
+
+    def is_revoked(self, user_id: str, token_version: int) -> bool:
+        return token_version < self._min_versions.get(user_id, 0)
+
+token_revocations = TokenRevocationRegistry(settings.token_revocation_refresh_seconds)
+
+async def revoke_user_tokens(db: AsyncIOMotorDatabase, email: str) -> int:
+    """Invalidate every token issued to a user so far; returns the new token version"""
+    user_data = await db.users.find_one_and_update(
+        {"email": email},
+        {"$inc": {"token_version": 1}},
+        projection={"id": 1, "token_version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if user_data is None:
+        return 0
+    
+    user_id = user_data.get("id", str(user_data["_id"]))
+    new_version = user_data["token_version"]
+    await db.token_revocations.update_one(
+        {"_id": user_id},
+        {"$max": {"min_version": new_version}, "$set": {"updated_at": datetime.now()}},
+        upsert=True
+    )
+    token_revocations.revoke(user_id, new_version)
+    invalidate_user_cache(email)
+    
+    logger.info("User tokens revoked", email=email, token_version=new_version)
+    return new_version
+
+def _user_from_claims(payload: dict) -> User:
+    """User built from stateless token claims (no password hash is carried)"""
+    return User(
+        id=payload["uid"],
+        email=payload["sub"],
+        full_name=payload.get("name") or payload["sub"],
+        is_active=payload.get("active", False),
+        hashed_password="",
+        token_version=payload["ver"]
+    )
+
+def _hash_refresh_token(token: str) -> str:
+    # Refresh tokens are random 384-bit values, so a fast hash is enough
+    return hashlib.sha256(token.encode()).hexdigest()
+
+async def issue_refresh_token(
+    db: AsyncIOMotorDatabase,
+    user: User,
+    family_id: Optional[str] = None
+) -> str:
+    """Create a refresh token for a user; only its hash is stored
+
+    Tokens rotated from one login share a ``family_id`` so reuse of a
+    rotated token can revoke the whole chain. Expired tokens are removed by
+    the TTL index on ``expires_at``.
+    """
+    token = secrets.token_urlsafe(48)
+    now = datetime.now()
+    await db.refresh_tokens.insert_one({
+        "_id": _hash_refresh_token(token),
+        "user_id": user.id,
+        "family_id": family_id or str(uuid.uuid4()),
+        "token_version": user.token_version,
+        "created_at": now,
+        "expires_at": now + timedelta(days=settings.refresh_token_expire_days),
+        "revoked_at": None
+    })
+    return token
+
+async def rotate_refresh_token(db: AsyncIOMotorDatabase, token: str) -> Optional[Tuple[User, str]]:
+    """Consume a refresh token and issue its replacement
+
+    Returns ``(user, new_refresh_token)``, or None if the token is unknown,
+    expired, already used, or belongs to a revoked or inactive user.
+    """
+    token_hash = _hash_refresh_token(token)
+    now = datetime.now()
+    record = await db.refresh_tokens.find_one_and_update(
+        {"_id": token_hash, "revoked_at": None, "expires_at": {"$gt": now}},
+        {"$set": {"revoked_at": now}}
+    )
+    if record is None:
+        reused = await db.refresh_tokens.find_one(
+            {"_id": token_hash, "revoked_at": {"$ne": None}}, {"family_id": 1}
+        )
+        if reused is not None:
+            # A rotated token came back: assume it leaked and end the session
+            await db.refresh_tokens.update_many(
+                {"family_id": reused["family_id"], "revoked_at": None},
+                {"$set": {"revoked_at": now}}
+            )
+            logger.warning("Refresh token reuse detected", family_id=reused["family_id"])
+        return None
+    
+    user = await get_user_by_id(db, record["user_id"])
+    if user is None or not user.is_active or record.get("token_version", 0) < user.token_version:
+        return None
+    
+    return user, await issue_refresh_token(db, user, record["family_id"])
+
 async def authenticate_user(db: AsyncIOMotorDatabase, email: str, password: str) -> Optional[User]:
     """Authenticate user with email and password"""
     user = await get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
 
@@ -83,9 +329,19 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = await get_user_by_email(db, email=token_data.email)
-    if user is None:
-        raise credentials_exception
+    token_version = payload.get("ver")
+    if settings.stateless_auth and token_version is not None and "uid" in payload:
+        # Fast path: trust the signed claims, checking only the revocation set
+        await token_revocations.refresh_if_stale(db)
+        if token_revocations.is_revoked(payload["uid"], token_version):
+            raise credentials_exception
+        user = _user_from_claims(payload)
+    else:
+        user = await get_cached_user_by_email(db, email=token_data.email)
+        if user is None:
+            raise credentials_exception
+        if token_version is not None and token_version < user.token_version:
+            raise credentials_exception
     
     if not user.is_active:
         raise HTTPException(
@@ -101,6 +357,16 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+def is_admin_email(email: str) -> bool:
+    admin_emails = {entry.strip().lower() for entry in settings.admin_emails.split(",") if entry.strip()}
+    return email.lower() in admin_emails
+
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+    """Get current active user, requiring it to be listed in ADMIN_EMAILS"""
+    if not is_admin_email(current_user.email):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
 async def create_user(db: AsyncIOMotorDatabase, email: str, password: str, full_name: str) -> User:
     """Create a new user"""
     # Check if user already exists
@@ -112,8 +378,9 @@ async def create_user(db: AsyncIOMotorDatabase, email: str, password: str, full_
         )
     
     # Create new user
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
     user_data = {
+        "id": str(uuid.uuid4()),
         "email": email,
         "full_name": full_name,
         "hashed_password": hashed_password,
@@ -122,8 +389,34 @@ async def create_user(db: AsyncIOMotorDatabase, email: str, password: str, full_
         "updated_at": datetime.now()
     }
     
-    result = await db.users.insert_one(user_data)
-    user_data["id"] = str(result.inserted_id)
+    await db.users.insert_one(user_data)
+    invalidate_user_cache(email)
     
     logger.info("User created successfully", email=email)
+    return User(**user_data)
+
+async def update_user(db: AsyncIOMotorDatabase, email: str, updates: UserUpdate) -> Optional[User]:
+    """Update a user (e.g. deactivate) and drop it from the user cache"""
+    update_data = {k: v for k, v in updates.dict().items() if v is not None}
+    if not update_data:
+        return await get_user_by_email(db, email)
+    
+    update_data["updated_at"] = datetime.now()
+    user_data = await db.users.find_one_and_update(
+        {"email": email},
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
+    )
+    invalidate_user_cache(email)
+    if user_data is None:
+        return None
+    new_email = user_data["email"]
+    if new_email != email:
+        invalidate_user_cache(new_email)
+    
+    # Tokens carry the email and active flag, so changing either revokes them
+    if new_email != email or update_data.get("is_active") is False:
+        user_data["token_version"] = await revoke_user_tokens(db, new_email)
+    
+    logger.info("User updated", email=email, fields=sorted(update_data))
     return User(**user_data)
\ No newline at end of file
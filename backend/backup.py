@@ -0,0 +1,215 @@
+"""
+Server-side backup and restore for SISMOBI 3.2.0
+
+A backup is a gzip stream of newline-delimited MongoDB Extended JSON. The
+first line is a header listing the collections; every following line is
+``{"collection": ..., "document": ...}``. Backups are read and compressed in
+chunks and restores are written in batches, so neither direction holds the
+dataset in memory.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List
+import zlib
+
+import structlog
+from bson import json_util
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from auth import invalidate_user_cache
+from references import invalidate_reference
+from rollups import rebuild_dashboard_rollups, rebuild_ledger
+from utils import invalidate_count_cache
+
+logger = structlog.get_logger(__name__)
+
+BACKUP_FORMAT = "sismobi-backup"
+BACKUP_VERSION = 1
+
+# Sessions, rate limits, dashboard rollups and the ledger are left out: the
+# first two are short-lived and the others are rebuilt from the restored data
+BACKUP_COLLECTIONS = [
+    "users", "properties", "tenants", "transactions", "alerts",
+    "documents", "energy_bills", "water_bills", "schema_migrations",
+]
+
+RESTORE_MODES = ("merge", "replace")
+
+BACKUP_CHUNK_SIZE = 500
+READ_SIZE = 64 * 1024
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+def _encode_line(record: Dict[str, Any]) -> bytes:
+    return (json_util.dumps(record, json_options=json_util.RELAXED_JSON_OPTIONS) + "\n").encode()
+
+async def stream_backup(db: AsyncIOMotorDatabase, chunk_size: int = BACKUP_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Gzip-compressed backup of every collection in ``BACKUP_COLLECTIONS``"""
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    yield compressor.compress(_encode_line({
+        "format": BACKUP_FORMAT,
+        "version": BACKUP_VERSION,
+        "created_at": datetime.now(),
+        "collections": BACKUP_COLLECTIONS,
+    }))
+
+    counts: Dict[str, int] = {}
+    for collection_name in BACKUP_COLLECTIONS:
+        lines: List[bytes] = []
+        counts[collection_name] = 0
+        async for document in db[collection_name].find({}).batch_size(1000):
+            lines.append(_encode_line({"collection": collection_name, "document": document}))
+            counts[collection_name] += 1
+            if len(lines) >= chunk_size:
+                compressed = compressor.compress(b"".join(lines))
+                lines = []
+                if compressed:
+                    yield compressed
+        if lines:
+            compressed = compressor.compress(b"".join(lines))
+            if compressed:
+                yield compressed
+
+    yield compressor.flush()
+    logger.info("Backup streamed", documents=counts)
+
+async def read_backup_lines(upload) -> AsyncIterator[bytes]:
+    """Decompressed lines of an uploaded backup, read a block at a time"""
+    decompressor = zlib.decompressobj(wbits=47)  # gzip or zlib, detected from the header
+    pending = b""
+    while True:
+        block = await upload.read(READ_SIZE)
+        if not block:
+            break
+        while block:
+            # Bounded output per step, so a tiny archive cannot expand at once
+            pending += decompressor.decompress(block, READ_SIZE * 16)
+            block = decompressor.unconsumed_tail
+            *lines, pending = pending.split(b"\n")
+            if len(pending) > MAX_LINE_BYTES:
+                raise ValueError("Backup line exceeds the maximum size")
+            for line in lines:
+                if line.strip():
+                    yield line
+    pending += decompressor.flush()
+    if not decompressor.eof:
+        raise ValueError("Backup is truncated")
+    if pending.strip():
+        yield pending
+
+async def read_backup_header(lines: AsyncIterator[bytes]) -> Dict[str, Any]:
+    """Read and check the header line of a backup"""
+    try:
+        header = json_util.loads(await lines.__anext__())
+    except StopAsyncIteration:
+        raise ValueError("Backup is empty")
+    except (zlib.error, ValueError):
+        raise ValueError("Not a SISMOBI backup")
+
+    if not isinstance(header, dict) or header.get("format") != BACKUP_FORMAT:
+        raise ValueError("Not a SISMOBI backup")
+    if header.get("version", 0) > BACKUP_VERSION:
+        raise ValueError(f"Unsupported backup version: {header.get('version')}")
+    unknown = set(header.get("collections", [])) - set(BACKUP_COLLECTIONS)
+    if unknown:
+        raise ValueError(f"Backup contains unsupported collections: {', '.join(sorted(unknown))}")
+    return header
+
+async def _write_batch(db: AsyncIOMotorDatabase, collection_name: str, documents: List[Dict[str, Any]], mode: str) -> tuple:
+    """Write one batch; returns (written, failed, first error message)"""
+    try:
+        if mode == "replace":
+            await db[collection_name].insert_many(documents, ordered=False)
+        else:
+            await db[collection_name].bulk_write(
+                [ReplaceOne({"_id": document["_id"]}, document, upsert=True) for document in documents],
+                ordered=False
+            )
+        return len(documents), 0, None
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        first_error = write_errors[0].get("errmsg") if write_errors else str(e)
+        return len(documents) - len(write_errors), len(write_errors), first_error
+
+def _parse_record(line: bytes, collections: List[str]) -> tuple:
+    """(collection name, document) of one backup line"""
+    record = json_util.loads(line)
+    collection_name = record.get("collection") if isinstance(record, dict) else None
+    if collection_name not in collections or not isinstance(record.get("document"), dict):
+        raise ValueError(f"Unexpected record for collection: {collection_name}")
+    return collection_name, record["document"]
+
+async def _records(upload, collections: List[str]) -> AsyncIterator[tuple]:
+    """Records of an uploaded backup from the start, skipping the header"""
+    await upload.seek(0)
+    lines = read_backup_lines(upload)
+    await read_backup_header(lines)
+    async for line in lines:
+        yield _parse_record(line, collections)
+
+async def restore_backup(
+    db: AsyncIOMotorDatabase,
+    header: Dict[str, Any],
+    upload,
+    mode: str = "merge",
+    batch_size: int = 1000
+) -> AsyncIterator[Dict[str, Any]]:
+    """Restore a backup, yielding a progress event after every batch
+
+    ``merge`` upserts documents by ``_id`` and keeps everything else;
+    ``replace`` empties the collections in the backup first and inserts.
+    The whole archive is read and checked in a first pass, so a corrupt or
+    truncated backup raises ValueError before anything is deleted or
+    written; the second pass writes it.
+    """
+    if mode not in RESTORE_MODES:
+        raise ValueError(f"Unknown restore mode: {mode}")
+
+    collections = header.get("collections", [])
+    verified: Dict[str, int] = defaultdict(int)
+    async for collection_name, _ in _records(upload, collections):
+        verified[collection_name] += 1
+    yield {"status": "verified", "documents": dict(verified)}
+
+    if mode == "replace":
+        for collection_name in collections:
+            await db[collection_name].delete_many({})
+
+    restored: Dict[str, int] = defaultdict(int)
+    failed: Dict[str, int] = defaultdict(int)
+    errors: List[str] = []
+    batch: List[Dict[str, Any]] = []
+    current = None
+
+    async def flush():
+        written, not_written, error = await _write_batch(db, current, batch, mode)
+        restored[current] += written
+        failed[current] += not_written
+        if error and len(errors) < 10:
+            errors.append(f"{current}: {error}")
+        return {"status": "progress", "collection": current,
+                "restored": restored[current], "failed": failed[current]}
+
+    async for collection_name, document in _records(upload, collections):
+        if batch and collection_name != current:
+            yield await flush()
+            batch = []
+        current = collection_name
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield await flush()
+            batch = []
+    if batch:
+        yield await flush()
+
+    # Everything derived from or cached over the restored data is stale now
+    invalidate_count_cache(*collections)
+    invalidate_user_cache()
+    for collection_name in collections:
+        invalidate_reference(collection_name)
+    await rebuild_dashboard_rollups(db)
+    await rebuild_ledger(db)
+
+    logger.info("Backup restored", mode=mode, restored=dict(restored), failed=dict(failed))
+    yield {"status": "completed", "mode": mode, "restored": dict(restored), "failed": dict(failed), "errors": errors}
@@ -0,0 +1,143 @@
+"""
+Dashboard summary latency benchmark for SISMOBI 3.2.0
+
+Compares the previous eight-query implementation with the two-pipeline
+``utils.calculate_dashboard_summary`` against a seeded scratch database.
+
+Usage (from the backend directory, with MongoDB running):
+    python benchmarks/dashboard_summary.py --properties 5000 --transactions 200000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from config import settings
+from utils import calculate_dashboard_summary, convert_objectid_to_str, get_month_range
+
+
+async def legacy_dashboard_summary(db):
+    """Sequential implementation kept for comparison"""
+    total_properties = await db.properties.count_documents({})
+    total_tenants = await db.tenants.count_documents({"status": "active"})
+    occupied_properties = await db.properties.count_documents({"status": "rented"})
+    vacant_properties = await db.properties.count_documents({"status": "vacant"})
+
+    month_start, next_month = get_month_range()
+    totals = {}
+    for transaction_type in ("income", "expense"):
+        result = await db.transactions.aggregate([
+            {"$match": {"type": transaction_type, "date": {"$gte": month_start, "$lt": next_month}}},
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+        ]).to_list(1)
+        totals[transaction_type] = result[0]["total"] if result else 0
+
+    pending_alerts = await db.alerts.count_documents({"resolved": False})
+    recent_transactions = [
+        convert_objectid_to_str(transaction)
+        async for transaction in db.transactions.find({}).sort("created_at", -1).limit(5)
+    ]
+
+    return {
+        "total_properties": total_properties,
+        "total_tenants": total_tenants,
+        "occupied_properties": occupied_properties,
+        "vacant_properties": vacant_properties,
+        "total_monthly_income": totals["income"],
+        "total_monthly_expenses": totals["expense"],
+        "pending_alerts": pending_alerts,
+        "recent_transactions": recent_transactions
+    }
+
+
+async def seed(db, properties: int, transactions: int):
+    """Fill the scratch database with random data"""
+    await db.client.drop_database(db.name)
+    now = datetime.now()
+    property_ids = [str(uuid.uuid4()) for _ in range(properties)]
+
+    await db.properties.insert_many([
+        {"id": property_id, "status": random.choice(["vacant", "rented", "maintenance"]), "created_at": now}
+        for property_id in property_ids
+    ])
+    await db.tenants.insert_many([
+        {"id": str(uuid.uuid4()), "property_id": property_id,
+         "status": random.choice(["active", "inactive"]), "created_at": now}
+        for property_id in property_ids
+    ])
+    await db.alerts.insert_many([
+        {"id": str(uuid.uuid4()), "resolved": random.random() < 0.7, "created_at": now}
+        for _ in range(max(properties // 2, 1))
+    ])
+
+    batch = []
+    for _ in range(transactions):
+        date = now - timedelta(days=random.randint(0, 730))
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "property_id": random.choice(property_ids),
+            "type": random.choice(["income", "expense"]),
+            "amount": round(random.uniform(10, 5000), 2),
+            "date": date,
+            "created_at": date
+        })
+        if len(batch) == 10000:
+            await db.transactions.insert_many(batch)
+            batch = []
+    if batch:
+        await db.transactions.insert_many(batch)
+
+    await db.transactions.create_index([("type", 1), ("date", 1)])
+    await db.transactions.create_index([("created_at", -1)])
+    await db.properties.create_index([("status", 1)])
+    await db.tenants.create_index([("status", 1)])
+    await db.alerts.create_index([("resolved", 1)])
+
+
+async def measure(label: str, func, db, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await func(db)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    print(f"{label:<12} mean={statistics.mean(samples):8.2f}ms  "
+          f"median={statistics.median(samples):8.2f}ms  p95={p95:8.2f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--properties", type=int, default=2000)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--database", default=f"{settings.database_name}_bench")
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(settings.mongo_url)
+    db = client[args.database]
+    if not args.skip_seed:
+        await seed(db, args.properties, args.transactions)
+
+    legacy = await legacy_dashboard_summary(db)
+    current = await calculate_dashboard_summary(db)
+    legacy.pop("recent_transactions"), current.pop("recent_transactions")
+    assert legacy == current, f"summaries differ: {legacy} != {current}"
+
+    await measure("sequential", legacy_dashboard_summary, db, args.iterations)
+    await measure("pipelines", calculate_dashboard_summary, db, args.iterations)
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
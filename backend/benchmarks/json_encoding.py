@@ -0,0 +1,96 @@
+"""
+List response encoding benchmark for SISMOBI 3.2.0
+
+Encodes a page of transactions the way FastAPI's default path does
+(``jsonable_encoder`` then stdlib ``json`` via ``JSONResponse``) and with
+``responses.APIJSONResponse`` (orjson on the raw documents). No database is
+needed.
+
+Usage (from the backend directory):
+    python benchmarks/json_encoding.py --items 100 --iterations 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models import TransactionType
+from responses import APIJSONResponse
+
+
+def build_page(items):
+    """A transactions list response as the handler returns it"""
+    now = datetime.now()
+    transactions = [
+        {
+            "id": str(uuid.uuid4()),
+            "property_id": str(uuid.uuid4()),
+            "tenant_id": str(uuid.uuid4()) if i % 3 else None,
+            "description": "Monthly rent " + "x" * random.randint(20, 400),
+            "amount": round(random.uniform(50, 5000), 2),
+            "type": random.choice(list(TransactionType)),
+            "category": random.choice(["rent", "maintenance", "utilities", "taxes"]),
+            "date": now - timedelta(days=i),
+            "recurring": bool(i % 2),
+            "recurring_day": 5 if i % 2 else None,
+            "notes": "n" * random.randint(0, 1000) or None,
+            "created_at": now - timedelta(days=i, hours=1),
+            "updated_at": now - timedelta(days=i),
+        }
+        for i in range(items)
+    ]
+    return {"items": transactions, "total": items * 10, "skip": 0, "limit": items, "has_more": True}
+
+
+def default_path(page):
+    return JSONResponse(jsonable_encoder(page)).body
+
+
+def orjson_path(page):
+    return APIJSONResponse(page).body
+
+
+def measure(encode, page, iterations):
+    encode(page)
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        encode(page)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "mean": statistics.mean(samples),
+        "median": statistics.median(samples),
+        "p95": samples[int(len(samples) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    page = build_page(args.items)
+    print(f"{args.items}-item page, {len(orjson_path(page)) / 1024:.1f} KiB encoded")
+    results = {}
+    for name, encode in (("jsonable_encoder + json", default_path), ("orjson", orjson_path)):
+        results[name] = measure(encode, page, args.iterations)
+        stats = results[name]
+        print(f"{name:>24}: mean {stats['mean']:.3f} ms, median {stats['median']:.3f} ms, p95 {stats['p95']:.3f} ms")
+
+    speedup = results["jsonable_encoder + json"]["median"] / results["orjson"]["median"]
+    print(f"{'speedup (median)':>24}: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,30 @@ class Settings(BaseSettings):
     secret_key: str = os.getenv("SECRET_KEY", "sismobi_super_secret_key_change_in_production_2025")
     algorithm: str = os.getenv("ALGORITHM", "HS256")
     access_token_expire_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    refresh_token_expire_days: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+    stateless_auth: bool = os.getenv("STATELESS_AUTH", "false").lower() == "true"
+    token_revocation_refresh_seconds: float = float(os.getenv("TOKEN_REVOCATION_REFRESH_SECONDS", "30"))
+    password_hash_workers: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    max_pending_password_hashes: int = int(os.getenv("MAX_PENDING_PASSWORD_HASHES", "32"))
+    
+    # Rate Limiting (token buckets: burst capacity, refill per minute)
+    rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    trust_proxy_headers: bool = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+    login_ip_rate_capacity: float = float(os.getenv("LOGIN_IP_RATE_CAPACITY", "20"))
+    login_ip_rate_per_minute: float = float(os.getenv("LOGIN_IP_RATE_PER_MINUTE", "10"))
+    login_email_rate_capacity: float = float(os.getenv("LOGIN_EMAIL_RATE_CAPACITY", "5"))
+    login_email_rate_per_minute: float = float(os.getenv("LOGIN_EMAIL_RATE_PER_MINUTE", "2"))
+    register_ip_rate_capacity: float = float(os.getenv("REGISTER_IP_RATE_CAPACITY", "5"))
+    register_ip_rate_per_minute: float = float(os.getenv("REGISTER_IP_RATE_PER_MINUTE", "1"))
+    user_cache_ttl_seconds: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    user_cache_max_size: int = int(os.getenv("USER_CACHE_MAX_SIZE", "1024"))
+    # Comma-separated emails allowed to use the /admin endpoints
+    admin_emails: str = os.getenv("ADMIN_EMAILS", "")
+    
+    # Consumption Alerts (a bill month is anomalous above the rolling mean of
+    # the previous months plus this many standard deviations)
+    consumption_baseline_months: int = int(os.getenv("CONSUMPTION_BASELINE_MONTHS", "6"))
+    consumption_anomaly_stddevs: float = float(os.getenv("CONSUMPTION_ANOMALY_STDDEVS", "2"))
     
     # API Configuration
     api_version: str = os.getenv("API_VERSION", "v1")
@@ -37,6 +61,15 @@ class Settings(BaseSettings):
     cache_expire_minutes: int = int(os.getenv("CACHE_EXPIRE_MINUTES", "10"))
     max_connections_count: int = int(os.getenv("MAX_CONNECTIONS_COUNT", "10"))
     min_connections_count: int = int(os.getenv("MIN_CONNECTIONS_COUNT", "1"))
+    auto_create_indexes: bool = os.getenv("AUTO_CREATE_INDEXES", "true").lower() == "true"
+    auto_run_migrations: bool = os.getenv("AUTO_RUN_MIGRATIONS", "true").lower() == "true"
+    bulk_max_items: int = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+    count_cache_ttl_seconds: float = float(os.getenv("COUNT_CACHE_TTL_SECONDS", "15"))
+    count_cache_max_size: int = int(os.getenv("COUNT_CACHE_MAX_SIZE", "1000"))
+    reference_cache_ttl_seconds: float = float(os.getenv("REFERENCE_CACHE_TTL_SECONDS", "30"))
+    reference_cache_max_size: int = int(os.getenv("REFERENCE_CACHE_MAX_SIZE", "10000"))
+    restore_batch_size: int = int(os.getenv("RESTORE_BATCH_SIZE", "1000"))
+    import_chunk_size: int = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
     
     class Config:
         env_file = ".env"
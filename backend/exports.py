@@ -0,0 +1,59 @@
+"""
+Streaming export helpers for SISMOBI 3.2.0
+
+Documents are read from a Motor cursor and written out in chunks, so an
+export holds at most one chunk in memory regardless of how many documents
+match.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Iterable, List
+import csv
+import io
+
+from responses import dumps
+
+EXPORT_CHUNK_SIZE = 500
+
+# Cells starting with these are evaluated as formulas by spreadsheet apps
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+async def _chunks(cursor, chunk_size: int) -> AsyncIterator[List[dict]]:
+    chunk: List[dict] = []
+    async for document in cursor:
+        chunk.append(document)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+async def stream_csv(cursor, columns: Iterable[str], chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[str]:
+    """CSV with a header row; fields missing from a document are left empty"""
+    columns = list(columns)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    async for chunk in _chunks(cursor, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(document.get(column)) for column in columns] for document in chunk)
+        yield buffer.getvalue()
+
+async def stream_ndjson(cursor, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """One JSON object per line"""
+    async for chunk in _chunks(cursor, chunk_size):
+        yield b"".join(dumps(document) + b"\n" for document in chunk)
@@ -0,0 +1,150 @@
+"""
+Index registry for SISMOBI 3.2.0
+
+Every index the application relies on is declared in ``INDEX_REGISTRY``.
+``ensure_indexes`` applies them idempotently (at startup and from
+``manage.py ensure-indexes``) and ``get_index_report`` compares the registry
+with what actually exists in the database.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+import structlog
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import OperationFailure
+
+from alert_jobs import ALERT_DEDUP_FIELDS, ALERT_DEDUP_INDEX, ALERT_LIST_INDEX, ALERT_LIST_SORT
+
+logger = structlog.get_logger(__name__)
+
+def index(name: str, keys: List[tuple], **options: Any) -> Dict[str, Any]:
+    """Declare one index; ``options`` are passed to ``create_index``"""
+    return {"name": name, "keys": keys, "options": options}
+
+def unique_id_index(collection_name: str) -> Dict[str, Any]:
+    return index(f"{collection_name}_id_unique", [("id", 1)], unique=True)
+
+LIST_ORDER_KEYS = [("created_at", -1), ("id", -1)]
+BILL_PERIOD_KEYS = [("property_id", 1), ("group_id", 1), ("year", 1), ("month", 1)]
+
+INDEX_REGISTRY: Dict[str, List[Dict[str, Any]]] = {
+    "users": [
+        # Users created before ids were stored have no "id" field
+        index("users_id_unique", [("id", 1)], unique=True,
+              partialFilterExpression={"id": {"$type": "string"}}),
+        index("users_email_unique", [("email", 1)], unique=True),
+    ],
+    "refresh_tokens": [
+        index("refresh_tokens_expires_at_ttl", [("expires_at", 1)], expireAfterSeconds=0),
+        index("refresh_tokens_family_id", [("family_id", 1)]),
+    ],
+    "rate_limits": [
+        index("rate_limits_expires_at_ttl", [("expires_at", 1)], expireAfterSeconds=0),
+    ],
+    "properties": [
+        unique_id_index("properties"),
+        index("properties_status", [("status", 1)]),
+        index("properties_list_order", LIST_ORDER_KEYS),
+    ],
+    "tenants": [
+        unique_id_index("tenants"),
+        index("tenants_email", [("email", 1)]),
+        index("tenants_property_id", [("property_id", 1)]),
+        index("tenants_status_rent_due_date", [("status", 1), ("rent_due_date", 1)]),
+        index("tenants_list_order", LIST_ORDER_KEYS),
+    ],
+    "transactions": [
+        unique_id_index("transactions"),
+        index("transactions_property_date", [("property_id", 1), ("date", -1)]),
+        index("transactions_tenant_date", [("tenant_id", 1), ("date", -1)]),
+        index("transactions_type_date", [("type", 1), ("date", -1)]),
+        index("transactions_date", [("date", -1)]),
+        index("transactions_created_at", [("created_at", -1)]),
+    ],
+    "alerts": [
+        unique_id_index("alerts"),
+        index(ALERT_DEDUP_INDEX, [(field, 1) for field in ALERT_DEDUP_FIELDS], unique=True,
+              partialFilterExpression={"month": {"$exists": True}}),
+        index(ALERT_LIST_INDEX, ALERT_LIST_SORT),
+        index("alerts_property_id", [("property_id", 1)]),
+        index("alerts_tenant_id", [("tenant_id", 1)]),
+    ],
+    "documents": [
+        unique_id_index("documents"),
+        index("documents_property_id", [("property_id", 1)]),
+        index("documents_tenant_id", [("tenant_id", 1)]),
+    ],
+    "energy_bills": [
+        unique_id_index("energy_bills"),
+        # Billing runs and imports upsert on this key
+        index("energy_bills_group_period_unique", BILL_PERIOD_KEYS, unique=True),
+        index("energy_bills_property_period", [("property_id", 1), ("year", 1), ("month", 1)]),
+        index("energy_bills_period", [("year", 1), ("month", 1), ("group_id", 1)]),
+    ],
+    "water_bills": [
+        unique_id_index("water_bills"),
+        # Billing runs and imports upsert on this key
+        index("water_bills_group_period_unique", BILL_PERIOD_KEYS, unique=True),
+        index("water_bills_property_period", [("property_id", 1), ("year", 1), ("month", 1)]),
+        index("water_bills_period", [("year", 1), ("month", 1), ("group_id", 1)]),
+    ],
+    "ledger_monthly": [
+        index("ledger_monthly_key", [("property_id", 1), ("year", 1), ("month", 1)], unique=True),
+        index("ledger_monthly_period", [("year", 1), ("month", 1)]),
+    ],
+}
+
+def _selected(collections: Optional[Iterable[str]]) -> Dict[str, List[Dict[str, Any]]]:
+    if collections is None:
+        return INDEX_REGISTRY
+    unknown = set(collections) - set(INDEX_REGISTRY)
+    if unknown:
+        raise ValueError(f"No indexes registered for: {', '.join(sorted(unknown))}")
+    return {name: INDEX_REGISTRY[name] for name in collections}
+
+async def ensure_indexes(
+    db: AsyncIOMotorDatabase,
+    collections: Optional[Iterable[str]] = None
+) -> Dict[str, List[str]]:
+    """Create every registered index that is missing
+
+    ``create_index`` is a no-op for an identical existing index. An index
+    whose name or options conflict with an existing one is logged and listed
+    under ``failed`` rather than aborting startup.
+    """
+    created: List[str] = []
+    failed: List[str] = []
+    for collection_name, specs in _selected(collections).items():
+        existing = {
+            info["name"] async for info in db[collection_name].list_indexes()
+        }
+        for spec in specs:
+            if spec["name"] in existing:
+                continue
+            try:
+                await db[collection_name].create_index(spec["keys"], name=spec["name"], **spec["options"])
+                created.append(f"{collection_name}.{spec['name']}")
+            except OperationFailure as e:
+                logger.error("Failed to create index",
+                             collection=collection_name, index=spec["name"], error=str(e))
+                failed.append(f"{collection_name}.{spec['name']}")
+
+    if created or failed:
+        logger.info("Indexes ensured", created=created, failed=failed)
+    return {"created": created, "failed": failed}
+
+async def get_index_report(
+    db: AsyncIOMotorDatabase,
+    collections: Optional[Iterable[str]] = None
+) -> Dict[str, Dict[str, List[str]]]:
+    """Registered indexes missing from each collection, and unregistered extras"""
+    report: Dict[str, Dict[str, List[str]]] = {}
+    for collection_name, specs in _selected(collections).items():
+        expected = {spec["name"] for spec in specs}
+        existing = {
+            info["name"] async for info in db[collection_name].list_indexes()
+        } - {"_id_"}
+        report[collection_name] = {
+            "missing": sorted(expected - existing),
+            "extra": sorted(existing - expected),
+        }
+    return report
@@ -0,0 +1,295 @@
+"""
+Spreadsheet ingestion of utility bills for SISMOBI 3.2.0
+
+Monthly meter readings arrive as CSV or XLSX files with one bill per row and
+a header row naming the bill fields. Rows are read lazily and handled in
+chunks: each chunk is validated with one call to a compiled ``TypeAdapter``,
+allocated with the vectorized engines and upserted with one ``bulk_write``
+keyed on (property, group, year, month). Only the current chunk and a capped
+list of row errors are held in memory, whatever the size of the file.
+
+Allocation inputs go in a single cell as ``recipient=value`` pairs separated
+by semicolons, e.g. ``apt101=120.5; apt102=80``.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import csv
+import io
+import uuid
+import zipfile
+
+import structlog
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from pydantic import TypeAdapter, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from starlette.concurrency import run_in_threadpool
+
+from allocations import (
+    allocate_energy_bills, allocate_water_bills, has_energy_allocation_inputs, validate_people_counts
+)
+from models import EnergyBillCreate, WaterBillCreate
+from references import find_missing_references
+from utils import format_validation_errors, invalidate_count_cache
+
+logger = structlog.get_logger(__name__)
+
+IMPORT_FORMATS = ("csv", "xlsx")
+MAX_REPORTED_ERRORS = 1000
+
+MAPPING_COLUMNS = ("meter_consumptions", "people_counts", "tenant_allocations")
+DATE_COLUMNS = ("reading_date", "due_date")
+# Spreadsheet apps turn ids such as "101" into numbers
+STRING_COLUMNS = ("property_id", "group_id", "residual_receiver")
+
+def _required_columns(model: type) -> List[str]:
+    return [name for name, field in model.model_fields.items() if field.is_required()]
+
+BILL_IMPORTS: Dict[str, Dict[str, Any]] = {
+    "energy": {
+        "collection": "energy_bills",
+        "adapter": TypeAdapter(List[EnergyBillCreate]),
+        "required_columns": _required_columns(EnergyBillCreate),
+        "has_allocation_inputs": has_energy_allocation_inputs,
+        "check": lambda bill: None,
+        "allocate": allocate_energy_bills,
+    },
+    "water": {
+        "collection": "water_bills",
+        "adapter": TypeAdapter(List[WaterBillCreate]),
+        "required_columns": _required_columns(WaterBillCreate),
+        "has_allocation_inputs": lambda bill: bool(bill.get("people_counts")),
+        "check": lambda bill: validate_people_counts(bill["people_counts"]),
+        "allocate": allocate_water_bills,
+    },
+}
+
+def detect_format(filename: Optional[str], file_format: Optional[str] = None) -> str:
+    """Explicit format, or the one implied by the file extension"""
+    if file_format:
+        return file_format
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension not in IMPORT_FORMATS:
+        raise ValueError("Unknown file format; upload a .csv or .xlsx file or pass format")
+    return extension
+
+def parse_mapping(value: str) -> Dict[str, str]:
+    """``"a=1; b=2"`` -> ``{"a": "1", "b": "2"}``; values are validated by the model"""
+    mapping: Dict[str, str] = {}
+    for pair in value.split(";"):
+        if not pair.strip():
+            continue
+        recipient, separator, amount = pair.partition("=")
+        if not separator or not recipient.strip():
+            raise ValueError("expected recipient=value pairs separated by ';'")
+        mapping[recipient.strip()] = amount.strip()
+    return mapping
+
+def _normalize_header(cell: Any) -> str:
+    return str(cell or "").strip().lower().replace(" ", "_")
+
+def _cell(column: str, value: Any) -> Any:
+    if isinstance(value, str):
+        value = value.strip()
+        if column in MAPPING_COLUMNS:
+            return parse_mapping(value)
+        if column in DATE_COLUMNS:
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                return value  # reported by the model
+        return value
+    if isinstance(value, float) and value.is_integer() and column in STRING_COLUMNS:
+        value = int(value)
+    if column in STRING_COLUMNS and isinstance(value, (int, float)):
+        return str(value)
+    return value
+
+def _prepare_row(columns: List[str], values: Sequence[Any]) -> Dict[str, Any]:
+    """Bill fields of a row; empty cells are left out so model defaults apply"""
+    row: Dict[str, Any] = {}
+    for column, value in zip(columns, values):
+        if not column or value is None or value == "":
+            continue
+        try:
+            row[column] = _cell(column, value)
+        except ValueError as e:
+            raise ValueError(f"{column}: {e}")
+    return row
+
+def open_rows(file, file_format: str) -> Tuple[List[str], Iterator[Sequence[Any]]]:
+    """Normalized header and a lazy iterator over the remaining rows"""
+    if file_format == "csv":
+        rows = csv.reader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+        workbook = None
+    else:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+
+    def iterate() -> Iterator[Sequence[Any]]:
+        try:
+            yield from rows
+        finally:
+            if workbook is not None:
+                workbook.close()
+
+    iterator = iterate()
+    header = next(iterator, None)
+    if header is None:
+        raise ValueError("The file is empty")
+    return [_normalize_header(cell) for cell in header], iterator
+
+def _read_chunk(
+    spec: Dict[str, Any],
+    columns: List[str],
+    rows: Iterator[Sequence[Any]],
+    first_row: int,
+    chunk_size: int
+) -> Tuple[int, List[Tuple[int, Dict[str, Any]]], List[Tuple[int, str]]]:
+    """Read and validate up to ``chunk_size`` rows
+
+    Returns the number of rows read, the valid bills and the row errors.
+    Blank rows count towards row numbers but are otherwise skipped.
+    """
+    read = 0
+    candidates: List[Tuple[int, Dict[str, Any]]] = []
+    errors: List[Tuple[int, str]] = []
+    for values in rows:
+        row_number = first_row + read
+        read += 1
+        if any(value not in (None, "") for value in values):
+            try:
+                candidates.append((row_number, _prepare_row(columns, values)))
+            except ValueError as e:
+                errors.append((row_number, str(e)))
+        if read >= chunk_size:
+            break
+
+    adapter = spec["adapter"]
+    try:
+        bills = adapter.validate_python([row for _, row in candidates])
+    except ValidationError as e:
+        # One pass reports every failing row; the rest validate in a second one
+        failures: Dict[int, List[Dict[str, Any]]] = {}
+        for error in e.errors():
+            failures.setdefault(error["loc"][0], []).append({**error, "loc": error["loc"][1:]})
+        errors.extend((candidates[position][0], format_validation_errors(row_errors))
+                      for position, row_errors in failures.items())
+        candidates = [candidate for position, candidate in enumerate(candidates) if position not in failures]
+        bills = adapter.validate_python([row for _, row in candidates])
+
+    valid: List[Tuple[int, Dict[str, Any]]] = []
+    for (row_number, _), bill in zip(candidates, bills):
+        bill_dict = bill.dict()
+        check_error = spec["check"](bill_dict)
+        if check_error:
+            errors.append((row_number, check_error))
+        else:
+            valid.append((row_number, bill_dict))
+    return read, valid, errors
+
+async def _write_chunk(
+    db: AsyncIOMotorDatabase,
+    spec: Dict[str, Any],
+    bills: List[Tuple[int, Dict[str, Any]]]
+) -> Tuple[int, int, List[Tuple[int, str]]]:
+    """Allocate and upsert a chunk of valid bills; returns (inserted, updated, errors)"""
+    errors: List[Tuple[int, str]] = []
+    missing = await find_missing_references(db, {"properties": [bill["property_id"] for _, bill in bills]})
+    # A later row for the same group and period replaces an earlier one, as
+    # it does across chunks
+    by_period: Dict[tuple, Tuple[int, Dict[str, Any]]] = {}
+    for row_number, bill in bills:
+        if bill["property_id"] in missing["properties"]:
+            errors.append((row_number, "Property not found"))
+        else:
+            by_period[(bill["property_id"], bill["group_id"], bill["year"], bill["month"])] = (row_number, bill)
+    if not by_period:
+        return 0, 0, errors
+
+    rows = list(by_period.values())
+    allocated = [bill for _, bill in rows if spec["has_allocation_inputs"](bill)]
+    for bill, allocation in zip(allocated, spec["allocate"](allocated)):
+        bill["tenant_allocations"] = allocation
+
+    now = datetime.now()
+    operations = [
+        UpdateOne(
+            {"property_id": bill["property_id"], "group_id": bill["group_id"],
+             "year": bill["year"], "month": bill["month"]},
+            {
+                "$set": {**bill, "updated_at": now},
+                "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now},
+            },
+            upsert=True
+        )
+        for _, bill in rows
+    ]
+    try:
+        result = await db[spec["collection"]].bulk_write(operations, ordered=False)
+        return result.upserted_count, result.matched_count, errors
+    except BulkWriteError as e:
+        errors.extend((rows[error["index"]][0], error.get("errmsg", "Write failed"))
+                      for error in e.details.get("writeErrors", []))
+        return e.details.get("nUpserted", 0), e.details.get("nMatched", 0), errors
+
+async def import_bills(
+    db: AsyncIOMotorDatabase,
+    kind: str,
+    file,
+    file_format: str,
+    chunk_size: int
+) -> Dict[str, Any]:
+    """Import a CSV or XLSX file of energy or water bills
+
+    Raises ValueError when the file cannot be read or lacks required
+    columns; invalid rows are reported and skipped.
+    """
+    spec = BILL_IMPORTS[kind]
+    try:
+        columns, rows = await run_in_threadpool(open_rows, file, file_format)
+    except UnicodeDecodeError:
+        raise ValueError("CSV files must be UTF-8 encoded")
+    except (OSError, KeyError, csv.Error, zipfile.BadZipFile, InvalidFileException) as e:
+        raise ValueError(f"Could not read the {file_format.upper()} file: {e}")
+
+    missing_columns = [column for column in spec["required_columns"] if column not in columns]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+
+    summary: Dict[str, Any] = {"rows": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": [],
+                               "errors_truncated": False}
+
+    def report(errors: List[Tuple[int, str]]) -> None:
+        summary["failed"] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(summary["errors"])
+        if len(errors) > room:
+            summary["errors_truncated"] = True
+        summary["errors"].extend({"row": row, "error": error} for row, error in sorted(errors)[:room])
+
+    while True:
+        try:
+            read, valid, errors = await run_in_threadpool(
+                _read_chunk, spec, columns, rows, summary["rows"] + 2, chunk_size
+            )
+        except UnicodeDecodeError:
+            raise ValueError(f"CSV files must be UTF-8 encoded (after row {summary['rows'] + 1})")
+        except csv.Error as e:
+            raise ValueError(f"Could not read the CSV file after row {summary['rows'] + 1}: {e}")
+        if read == 0:
+            break
+        summary["rows"] += read
+        if valid:
+            inserted, updated, write_errors = await _write_chunk(db, spec, valid)
+            summary["inserted"] += inserted
+            summary["updated"] += updated
+            errors.extend(write_errors)
+        report(errors)
+
+    if summary["inserted"]:
+        invalidate_count_cache(spec["collection"])
+    logger.info("Bills imported", kind=kind, format=file_format,
+                **{key: summary[key] for key in ("rows", "inserted", "updated", "failed")})
+    return summary
@@ -0,0 +1,143 @@
+"""
+Maintenance commands for SISMOBI 3.2.0
+
+Usage (from the backend directory):
+    python manage.py rebuild-rollups
+    python manage.py rebuild-ledger
+    python manage.py generate-alerts
+    python manage.py consumption-alerts [--year YEAR --month MONTH]
+    python manage.py ensure-indexes
+    python manage.py index-report
+    python manage.py migrate
+    python manage.py deactivate-user EMAIL
+"""
+import argparse
+import asyncio
+import sys
+
+import structlog
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from rollups import rebuild_dashboard_rollups, rebuild_ledger
+from alert_jobs import run_automatic_alerts, run_consumption_alerts
+from indexes import ensure_indexes, get_index_report
+from migrations import get_pending_migrations, run_migrations
+from auth import update_user
+from models import UserUpdate
+
+logger = structlog.get_logger(__name__)
+
+async def rebuild_rollups_command(args) -> None:
+    """Recompute dashboard rollups from source collections"""
+    result = await rebuild_dashboard_rollups(get_database())
+    print(f"Rebuilt dashboard rollups: {result['months']} month(s), totals={result['totals']}")
+
+async def rebuild_ledger_command(args) -> None:
+    """Recompute the monthly ledger from transactions"""
+    db = get_database()
+    await ensure_indexes(db, ["ledger_monthly"])
+    result = await rebuild_ledger(db)
+    print(f"Rebuilt ledger: {result['documents']} property-month(s), {result['removed']} stale removed")
+
+async def generate_alerts_command(args) -> None:
+    """Generate and persist this month's automatic alerts"""
+    db = get_database()
+    await ensure_indexes(db, ["alerts"])
+    result = await run_automatic_alerts(db)
+    print(f"Generated {result['generated']} alert(s): "
+          f"{result['inserted']} inserted, {result['updated']} updated")
+
+async def consumption_alerts_command(args) -> None:
+    """Flag anomalous energy and water consumption for a month"""
+    db = get_database()
+    await ensure_indexes(db, ["alerts"])
+    result = await run_consumption_alerts(db, args.year, args.month)
+    print(f"Generated {result['generated']} consumption alert(s): "
+          f"{result['inserted']} inserted, {result['updated']} updated")
+
+async def ensure_indexes_command(args) -> None:
+    """Create every registered index that is missing"""
+    result = await ensure_indexes(get_database())
+    print(f"Created {len(result['created'])} index(es)")
+    for name in result["created"]:
+        print(f"  + {name}")
+    for name in result["failed"]:
+        print(f"  ! {name} (conflicts with an existing index)")
+
+async def index_report_command(args) -> None:
+    """Compare registered indexes with the database"""
+    report = await get_index_report(get_database())
+    for collection_name, entry in report.items():
+        if not entry["missing"] and not entry["extra"]:
+            print(f"{collection_name}: ok")
+            continue
+        print(f"{collection_name}:")
+        for name in entry["missing"]:
+            print(f"  missing: {name}")
+        for name in entry["extra"]:
+            print(f"  extra:   {name}")
+
+async def migrate_command(args) -> None:
+    """Apply pending data migrations"""
+    db = get_database()
+    pending = await get_pending_migrations(db)
+    if not pending:
+        print("No pending migrations")
+        return
+    for name in await run_migrations(db):
+        print(f"Applied {name}")
+
+async def deactivate_user_command(args) -> None:
+    """Mark a user inactive; running servers drop their cached copy within the user cache TTL"""
+    user = await update_user(get_database(), args.email, UserUpdate(is_active=False))
+    if user is None:
+        raise ValueError(f"User not found: {args.email}")
+    print(f"Deactivated {user.email}")
+
+COMMANDS = {
+    "rebuild-rollups": (rebuild_rollups_command, "Recompute dashboard_rollups from source data"),
+    "rebuild-ledger": (rebuild_ledger_command, "Recompute ledger_monthly from transactions"),
+    "generate-alerts": (generate_alerts_command, "Generate and persist automatic rent alerts"),
+    "consumption-alerts": (consumption_alerts_command, "Generate high energy/water bill alerts for a month"),
+    "ensure-indexes": (ensure_indexes_command, "Create missing registered indexes"),
+    "index-report": (index_report_command, "Report missing and unregistered indexes"),
+    "migrate": (migrate_command, "Apply pending data migrations"),
+    "deactivate-user": (deactivate_user_command, "Deactivate a user account"),
+}
+
+COMMAND_ARGUMENTS = {
+    "consumption-alerts": [
+        ("--year", {"type": int, "help": "Billing year (default: current)"}),
+        ("--month", {"type": int, "choices": range(1, 13), "metavar": "MONTH", "help": "Billing month (default: current)"}),
+    ],
+    "deactivate-user": [("email", {"help": "Email of the user to deactivate"})],
+}
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="SISMOBI maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        for argument, options in COMMAND_ARGUMENTS.get(name, []):
+            subparser.add_argument(argument, **options)
+    return parser
+
+async def run(args) -> None:
+    await connect_to_mongo()
+    try:
+        handler, _ = COMMANDS[args.command]
+        await handler(args)
+    finally:
+        await close_mongo_connection()
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        asyncio.run(run(args))
+    except Exception as e:
+        logger.error("Command failed", command=args.command, error=str(e))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Data migrations for SISMOBI 3.2.0
+
+Migrations run once each, in the order listed in ``MIGRATIONS``; applied
+ones are recorded in the ``schema_migrations`` collection. Every server
+worker runs pending migrations at startup, so two workers may apply the same
+one concurrently: migrations must be idempotent and recording is an upsert.
+"""
+from datetime import datetime
+from typing import Awaitable, Callable, List, Tuple
+
+import structlog
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from alert_jobs import (
+    backfill_alert_priority_scores, drop_legacy_alert_dedup_index, drop_legacy_alert_list_index
+)
+from rollups import rebuild_dashboard_rollups, rebuild_ledger
+
+logger = structlog.get_logger(__name__)
+
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+Migration = Tuple[str, Callable[[AsyncIOMotorDatabase], Awaitable[object]]]
+
+async def backfill_user_ids(db: AsyncIOMotorDatabase) -> int:
+    """Persist an id on users created before create_user stored one
+
+    The id is derived from ``_id`` so it matches what ``revoke_user_tokens``
+    already used for such users.
+    """
+    result = await db.users.update_many(
+        {"id": {"$exists": False}},
+        [{"$set": {"id": {"$toString": "$_id"}}}]
+    )
+    return result.modified_count
+
+MIGRATIONS: List[Migration] = [
+    ("0001_backfill_alert_priority_scores", backfill_alert_priority_scores),
+    ("0002_backfill_user_ids", backfill_user_ids),
+    ("0003_drop_legacy_alert_dedup_index", drop_legacy_alert_dedup_index),
+    # Incremental $inc upserts would otherwise create rollups holding only
+    # the changes made after the upgrade
+    ("0004_build_dashboard_rollups", rebuild_dashboard_rollups),
+    ("0005_build_ledger", rebuild_ledger),
+    ("0006_drop_legacy_alert_list_index", drop_legacy_alert_list_index),
+]
+
+async def get_pending_migrations(db: AsyncIOMotorDatabase) -> List[str]:
+    """Names of registered migrations that have not been applied yet"""
+    applied = {
+        record["_id"] async for record in db[MIGRATIONS_COLLECTION].find({}, {"_id": 1})
+    }
+    return [name for name, _ in MIGRATIONS if name not in applied]
+
+async def run_migrations(db: AsyncIOMotorDatabase) -> List[str]:
+    """Apply pending migrations in order; returns the names applied"""
+    pending = set(await get_pending_migrations(db))
+    applied: List[str] = []
+    for name, migration in MIGRATIONS:
+        if name not in pending:
+            continue
+        logger.info("Applying migration", migration=name)
+        result = await migration(db)
+        await db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": name},
+            {"$setOnInsert": {
+                "applied_at": datetime.now(),
+                "result": result if isinstance(result, (int, float, str, dict, list)) else None
+            }},
+            upsert=True
+        )
+        applied.append(name)
+    return applied
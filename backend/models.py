@@ -1,7 +1,7 @@
 """
 Pydantic models for SISMOBI 3.2.0
 """
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, NonNegativeFloat, validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -191,6 +191,10 @@ class EnergyBillBase(BaseModel):
     total_kwh: float = Field(..., gt=0)
     reading_date: datetime
     due_date: datetime
+    # Allocation inputs: kWh per metered recipient, and the recipient without
+    # a meter that pays for the remainder of the group consumption
+    meter_consumptions: Dict[str, NonNegativeFloat] = Field(default_factory=dict)
+    residual_receiver: Optional[str] = None
     tenant_allocations: Dict[str, float] = Field(default_factory=dict)
 
 class EnergyBillCreate(EnergyBillBase):
@@ -201,6 +205,8 @@ class EnergyBillUpdate(BaseModel):
     total_kwh: Optional[float] = Field(None, gt=0)
     reading_date: Optional[datetime] = None
     due_date: Optional[datetime] = None
+    meter_consumptions: Optional[Dict[str, NonNegativeFloat]] = None
+    residual_receiver: Optional[str] = None
     tenant_allocations: Optional[Dict[str, float]] = None
 
 class EnergyBill(EnergyBillBase, BaseDocument):
@@ -216,6 +222,8 @@ class WaterBillBase(BaseModel):
     total_liters: float = Field(..., gt=0)
     reading_date: datetime
     due_date: datetime
+    # Allocation input: number of people per recipient
+    people_counts: Dict[str, int] = Field(default_factory=dict)
     tenant_allocations: Dict[str, float] = Field(default_factory=dict)
 
 class WaterBillCreate(WaterBillBase):
@@ -231,6 +239,21 @@ class WaterBillUpdate(BaseModel):
 class WaterBill(WaterBillBase, BaseDocument):
     pass
 
+class WaterGroupReading(BaseModel):
+    property_id: str
+    group_id: str = Field(..., min_length=1, max_length=100)
+    total_amount: float = Field(..., gt=0)
+    total_liters: float = Field(..., gt=0)
+    people_counts: Dict[str, int] = Field(..., min_length=1)
+
+class WaterBillingRun(BaseModel):
+    month: int = Field(..., ge=1, le=12)
+    year: int = Field(..., ge=2000, le=3000)
+    reading_date: datetime
+    due_date: datetime
+    groups: List[WaterGroupReading] = Field(..., min_length=1)
+    persist: bool = True
+
 # User Models (for authentication)
 class UserBase(BaseModel):
     email: str = Field(..., pattern=r'^[^@]+@[^@]+\.[^@]+$')
@@ -252,11 +275,16 @@ class UserUpdate(BaseModel):
 
 class User(UserBase, BaseDocument):
     hashed_password: str
+    token_version: int = 0
 
 # Authentication Models
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=1)
 
 class TokenData(BaseModel):
     email: Optional[str] = None
@@ -266,6 +294,17 @@ class MessageResponse(BaseModel):
     message: str
     status: str = "success"
 
+class BulkItemResult(BaseModel):
+    index: int
+    status: str = Field(..., pattern=r'^(created|failed)$')
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkCreateResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkItemResult]
+
 class HealthResponse(BaseModel):
     status: str
     timestamp: datetime = Field(default_factory=datetime.now)
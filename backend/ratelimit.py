@@ -0,0 +1,154 @@
+"""
+Token-bucket rate limiting for SISMOBI 3.2.0
+
+Limiters share a backend that stores buckets. The default in-memory backend
+is per process; ``MongoRateLimitBackend`` keeps buckets in the
+``rate_limits`` collection so every worker enforces the same budget. Select
+one with ``RATE_LIMIT_BACKEND`` (``memory`` or ``mongodb``).
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+import time
+
+from fastapi import HTTPException, Request, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+import structlog
+
+from config import settings
+
+logger = structlog.get_logger(__name__)
+
+class RateLimitBackend(ABC):
+    """Storage for token buckets"""
+
+    @abstractmethod
+    async def consume(
+        self,
+        key: str,
+        capacity: float,
+        refill_per_second: float,
+        cost: float = 1
+    ) -> Tuple[bool, float]:
+        """Take ``cost`` tokens from a bucket; returns (allowed, retry_after_seconds)"""
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process buckets, bounded by evicting the least recently used"""
+
+    def __init__(self, max_buckets: int = 100000):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def consume(self, key, capacity, refill_per_second, cost=1):
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * refill_per_second)
+
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+
+        retry_after = 0.0 if allowed else (cost - tokens) / refill_per_second
+        return allowed, retry_after
+
+class MongoRateLimitBackend(RateLimitBackend):
+    """Buckets shared by all workers, updated atomically with a pipeline update"""
+
+    def __init__(self, get_db: Callable[[], AsyncIOMotorDatabase], collection_name: str = "rate_limits"):
+        self.get_db = get_db
+        self.collection_name = collection_name
+
+    async def consume(self, key, capacity, refill_per_second, cost=1):
+        now = datetime.now()
+        elapsed_seconds = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        refilled = {
+            "$min": [
+                capacity,
+                {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed_seconds, refill_per_second]}]}
+            ]
+        }
+        # Idle buckets are full again after this long, so they can expire
+        idle_expiry = now + timedelta(seconds=capacity / refill_per_second)
+        bucket = await self.get_db()[self.collection_name].find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": now, "expires_at": idle_expiry}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        allowed = bucket["allowed"]
+        retry_after = 0.0 if allowed else (cost - bucket["tokens"]) / refill_per_second
+        return allowed, retry_after
+
+_backend: Optional[RateLimitBackend] = None
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """Backend shared by all limiters, created from settings on first use"""
+    global _backend
+    if _backend is None:
+        if settings.rate_limit_backend == "mongodb":
+            from database import get_database
+            _backend = MongoRateLimitBackend(get_database)
+        else:
+            _backend = InMemoryRateLimitBackend()
+    return _backend
+
+def set_rate_limit_backend(backend: RateLimitBackend) -> None:
+    """Replace the shared backend (e.g. with another shared store)"""
+    global _backend
+    _backend = backend
+
+class TokenBucketLimiter:
+    """Named limit: ``capacity`` requests in a burst, refilled at ``per_minute``"""
+
+    def __init__(self, name: str, capacity: float, per_minute: float):
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = per_minute / 60.0
+
+    async def hit(self, identifier: str) -> Tuple[bool, float]:
+        return await get_rate_limit_backend().consume(
+            f"{self.name}:{identifier}", self.capacity, self.refill_per_second
+        )
+
+def get_client_ip(request: Request) -> str:
+    """Client address, honouring X-Forwarded-For only behind a trusted proxy"""
+    if settings.trust_proxy_headers:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, please try again later",
+        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+    )
+
+async def enforce_rate_limits(*checks: Tuple[TokenBucketLimiter, str]) -> None:
+    """Raise 429 if any (limiter, identifier) pair is over its budget"""
+    for limiter, identifier in checks:
+        allowed, retry_after = await limiter.hit(identifier)
+        if not allowed:
+            logger.warning("Rate limit exceeded", limiter=limiter.name, identifier=identifier)
+            raise too_many_requests(retry_after)
+
+login_ip_limiter = TokenBucketLimiter(
+    "login:ip", settings.login_ip_rate_capacity, settings.login_ip_rate_per_minute
+)
+login_email_limiter = TokenBucketLimiter(
+    "login:email", settings.login_email_rate_capacity, settings.login_email_rate_per_minute
+)
+register_ip_limiter = TokenBucketLimiter(
+    "register:ip", settings.register_ip_rate_capacity, settings.register_ip_rate_per_minute
+)
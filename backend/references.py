@@ -0,0 +1,73 @@
+"""
+Reference validation for SISMOBI 3.2.0
+
+Writes that point at properties or tenants check the referenced ids with one
+projected ``$in`` query per collection, for a single document or a whole
+bulk request. Ids found to exist are remembered for a short time so repeated
+writes against the same property skip the query; missing ids are never
+cached, and deletes drop their id from the cache.
+"""
+from typing import Dict, Iterable, Optional, Set
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from cache import TTLCache
+from config import settings
+
+# Keyed by (collection name, id). Per worker, so another worker may accept a
+# reference to a just-deleted document for up to the TTL.
+_existence_cache = TTLCache(
+    max_size=settings.reference_cache_max_size,
+    ttl_seconds=settings.reference_cache_ttl_seconds
+)
+
+REFERENCE_LABELS = {"properties": "Property", "tenants": "Tenant"}
+
+async def find_existing_ids(db: AsyncIOMotorDatabase, collection_name: str, ids: Iterable[Optional[str]]) -> Set[str]:
+    """Subset of ``ids`` that exist in a collection"""
+    ids = {document_id for document_id in ids if document_id}
+    existing = {document_id for document_id in ids if _existence_cache.get((collection_name, document_id))}
+    unknown = ids - existing
+    if unknown:
+        cursor = db[collection_name].find({"id": {"$in": list(unknown)}}, {"_id": 0, "id": 1})
+        async for document in cursor:
+            _existence_cache.set((collection_name, document["id"]), True)
+            existing.add(document["id"])
+    return existing
+
+async def find_missing_references(
+    db: AsyncIOMotorDatabase,
+    references: Dict[str, Iterable[Optional[str]]]
+) -> Dict[str, Set[str]]:
+    """Referenced ids that do not exist, per collection; collections are queried concurrently"""
+    wanted = {
+        collection_name: {document_id for document_id in ids if document_id}
+        for collection_name, ids in references.items()
+    }
+    existing = await asyncio.gather(*(
+        find_existing_ids(db, collection_name, ids) for collection_name, ids in wanted.items()
+    ))
+    return {
+        collection_name: ids - found
+        for (collection_name, ids), found in zip(wanted.items(), existing)
+    }
+
+async def check_references(
+    db: AsyncIOMotorDatabase,
+    property_id: Optional[str] = None,
+    tenant_id: Optional[str] = None
+) -> Optional[str]:
+    """Error message for the first missing reference of a single write, or None"""
+    missing = await find_missing_references(db, {"properties": [property_id], "tenants": [tenant_id]})
+    for collection_name, ids in missing.items():
+        if ids:
+            return f"{REFERENCE_LABELS[collection_name]} not found"
+    return None
+
+def invalidate_reference(collection_name: str, document_id: Optional[str] = None) -> None:
+    """Forget that a document exists (call after deleting it); without an id, forget the whole collection"""
+    if document_id is None:
+        _existence_cache.invalidate_where(lambda key: key[0] == collection_name)
+    else:
+        _existence_cache.invalidate((collection_name, document_id))
@@ -0,0 +1,38 @@
+"""
+JSON response encoding for SISMOBI 3.2.0
+
+Responses are encoded with orjson, which handles datetime, date, UUID, enum
+and numpy values natively. Values orjson does not know (ObjectId,
+Decimal128) go through ``orjson_default``.
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import ORJSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def orjson_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    """Encode a value the same way API responses are encoded"""
+    return orjson.dumps(content, default=orjson_default, option=ORJSON_OPTIONS)
+
+class APIJSONResponse(ORJSONResponse):
+    """Default response class of the API
+
+    Handlers returning one of these directly skip FastAPI's
+    ``jsonable_encoder`` pass, which the list endpoints do for their pages.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
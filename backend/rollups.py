@@ -0,0 +1,493 @@
+"""
+Materialized dashboard rollups for SISMOBI 3.2.0
+
+The ``dashboard_rollups`` collection holds one ``totals`` document with the
+current property/tenant/alert counters and one document per month
+(``_id`` = ``"YYYY-MM"``) with income and expense sums. Write handlers keep it
+up to date with ``$inc``; ``rebuild_dashboard_rollups`` recomputes everything
+from the source collections to repair drift.
+
+The ``ledger_monthly`` collection holds one document per (property_id, year,
+month) with income and expense sums and per-category totals
+(``by_category.<type>.<category>``). It is maintained by the same transaction
+hooks and rebuilt with ``rebuild_ledger``.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from utils import calculate_dashboard_summary, convert_objectid_to_str, get_month_range
+
+logger = structlog.get_logger(__name__)
+
+ROLLUPS_COLLECTION = "dashboard_rollups"
+TOTALS_ID = "totals"
+LEDGER_COLLECTION = "ledger_monthly"
+LEDGER_REBUILD_BATCH_SIZE = 1000
+
+# Category names become field names; "." and a leading "$" are not allowed
+# there, so they are stored as their full-width equivalents
+_CATEGORY_ESCAPES = (("\uff0e", "."), ("\uff04", "$"))
+
+def category_field(category: str) -> str:
+    """Field name storing a transaction category in ``by_category``"""
+    for escaped, character in _CATEGORY_ESCAPES:
+        category = category.replace(character, escaped)
+    return category
+
+def category_name(field: str) -> str:
+    """Category stored under a ``by_category`` field name"""
+    for escaped, character in _CATEGORY_ESCAPES:
+        field = field.replace(escaped, character)
+    return field
+
+def month_key(date: datetime) -> str:
+    """Rollup document id for the month of ``date``"""
+    return f"{date.year:04d}-{date.month:02d}"
+
+async def _apply_totals_delta(db: AsyncIOMotorDatabase, delta: Dict[str, int]) -> None:
+    delta = {field: value for field, value in delta.items() if value}
+    if delta:
+        await db[ROLLUPS_COLLECTION].update_one(
+            {"_id": TOTALS_ID},
+            {"$inc": delta, "$set": {"updated_at": datetime.now()}},
+            upsert=True
+        )
+
+async def _apply_monthly_deltas(db: AsyncIOMotorDatabase, deltas: Dict[str, Dict[str, float]]) -> None:
+    operations = []
+    for key, delta in deltas.items():
+        delta = {field: value for field, value in delta.items() if value}
+        if not delta:
+            continue
+        year, month = (int(part) for part in key.split("-"))
+        operations.append(UpdateOne(
+            {"_id": key},
+            {
+                "$inc": delta,
+                "$set": {"updated_at": datetime.now()},
+                "$setOnInsert": {"year": year, "month": month}
+            },
+            upsert=True
+        ))
+    if operations:
+        await db[ROLLUPS_COLLECTION].bulk_write(operations, ordered=False)
+
+async def _apply_ledger_deltas(db: AsyncIOMotorDatabase, deltas: Dict[tuple, Dict[str, float]]) -> None:
+    operations = []
+    for (property_id, year, month), delta in deltas.items():
+        delta = {field: value for field, value in delta.items() if value}
+        if not delta:
+            continue
+        operations.append(UpdateOne(
+            {"property_id": property_id, "year": year, "month": month},
+            {"$inc": delta, "$set": {"updated_at": datetime.now()}},
+            upsert=True
+        ))
+    if operations:
+        await db[LEDGER_COLLECTION].bulk_write(operations, ordered=False)
+
+def _transaction_contribution(transaction: Optional[Dict[str, Any]]) -> Optional[tuple]:
+    """(date, type, amount) a transaction adds to the monthly rollups"""
+    if not transaction:
+        return None
+    transaction_type = getattr(transaction.get("type"), "value", transaction.get("type"))
+    date = transaction.get("date")
+    if transaction_type not in ("income", "expense") or not isinstance(date, datetime):
+        return None
+    return date, transaction_type, transaction.get("amount", 0)
+
+def _add_ledger_delta(
+    deltas: Dict[tuple, Dict[str, float]],
+    property_id: Optional[str],
+    year: int,
+    month: int,
+    transaction_type: str,
+    category: Optional[str],
+    amount: float
+) -> None:
+    delta = deltas[(property_id, year, month)]
+    delta[transaction_type] += amount
+    delta[f"by_category.{transaction_type}.{category_field(category or 'uncategorized')}"] += amount
+
+async def record_transaction_changes(
+    db: AsyncIOMotorDatabase,
+    changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]
+) -> None:
+    """Apply many (before, after) transaction pairs in one round trip per collection"""
+    try:
+        deltas: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        ledger_deltas: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for before, after in changes:
+            for document, sign in ((before, -1), (after, 1)):
+                contribution = _transaction_contribution(document)
+                if contribution:
+                    date, field, amount = contribution
+                    deltas[month_key(date)][field] += sign * amount
+                    _add_ledger_delta(ledger_deltas, document.get("property_id"), date.year, date.month,
+                                      field, document.get("category"), sign * amount)
+        await asyncio.gather(_apply_monthly_deltas(db, deltas), _apply_ledger_deltas(db, ledger_deltas))
+    except Exception as e:
+        logger.error("Error updating transaction rollups", error=str(e))
+
+async def record_transaction_change(
+    db: AsyncIOMotorDatabase,
+    before: Optional[Dict[str, Any]],
+    after: Optional[Dict[str, Any]]
+) -> None:
+    """Apply a created (before=None), updated or deleted (after=None) transaction"""
+    await record_transaction_changes(db, [(before, after)])
+
+async def record_transactions_removed(db: AsyncIOMotorDatabase, filter_dict: Dict[str, Any]) -> None:
+    """Subtract transactions matching ``filter_dict``; call before deleting them"""
+    try:
+        pipeline = [
+            {"$match": {**filter_dict, "type": {"$in": ["income", "expense"]}, "date": {"$type": "date"}}},
+            {
+                "$group": {
+                    "_id": {
+                        "property_id": "$property_id",
+                        "year": {"$year": "$date"},
+                        "month": {"$month": "$date"},
+                        "type": "$type",
+                        "category": "$category"
+                    },
+                    "total": {"$sum": "$amount"}
+                }
+            }
+        ]
+        deltas: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        ledger_deltas: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        async for row in db.transactions.aggregate(pipeline):
+            group = row["_id"]
+            key = f"{group['year']:04d}-{group['month']:02d}"
+            deltas[key][group["type"]] -= row["total"]
+            _add_ledger_delta(ledger_deltas, group.get("property_id"), group["year"], group["month"],
+                              group["type"], group.get("category"), -row["total"])
+        await asyncio.gather(_apply_monthly_deltas(db, deltas), _apply_ledger_deltas(db, ledger_deltas))
+    except Exception as e:
+        logger.error("Error updating transaction rollups", error=str(e))
+
+def _property_counters(property_doc: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    if not property_doc:
+        return {}
+    status = property_doc.get("status")
+    status = getattr(status, "value", status)
+    return {
+        "total_properties": 1,
+        "occupied_properties": int(status == "rented"),
+        "vacant_properties": int(status == "vacant"),
+    }
+
+def _tenant_counters(tenant_doc: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    if not tenant_doc:
+        return {}
+    status = tenant_doc.get("status")
+    return {"active_tenants": int(getattr(status, "value", status) == "active")}
+
+def _alert_counters(alert_doc: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    if not alert_doc:
+        return {}
+    return {"pending_alerts": int(not alert_doc.get("resolved", False))}
+
+async def _record_counter_changes(db, counters, changes, label: str) -> None:
+    try:
+        delta: Dict[str, int] = defaultdict(int)
+        for before, after in changes:
+            for document, sign in ((before, -1), (after, 1)):
+                for field, value in counters(document).items():
+                    delta[field] += sign * value
+        await _apply_totals_delta(db, delta)
+    except Exception as e:
+        logger.error(f"Error updating {label} rollups", error=str(e))
+
+async def record_property_change(db: AsyncIOMotorDatabase, before, after) -> None:
+    """Apply a created, updated or deleted property to the totals"""
+    await _record_counter_changes(db, _property_counters, [(before, after)], "property")
+
+async def record_property_changes(db: AsyncIOMotorDatabase, changes) -> None:
+    """Apply many (before, after) property pairs in one round trip"""
+    await _record_counter_changes(db, _property_counters, changes, "property")
+
+async def record_tenant_change(db: AsyncIOMotorDatabase, before, after) -> None:
+    """Apply a created, updated or deleted tenant to the totals"""
+    await _record_counter_changes(db, _tenant_counters, [(before, after)], "tenant")
+
+async def record_tenant_changes(db: AsyncIOMotorDatabase, changes) -> None:
+    """Apply many (before, after) tenant pairs in one round trip"""
+    await _record_counter_changes(db, _tenant_counters, changes, "tenant")
+
+async def record_alert_change(db: AsyncIOMotorDatabase, before, after) -> None:
+    """Apply a created, updated or deleted alert to the totals"""
+    await _record_counter_changes(db, _alert_counters, [(before, after)], "alert")
+
+async def record_pending_alerts_delta(db: AsyncIOMotorDatabase, delta: int) -> None:
+    """Adjust the open-alert counter after bulk alert writes"""
+    try:
+        await _apply_totals_delta(db, {"pending_alerts": delta})
+    except Exception as e:
+        logger.error("Error updating alert rollups", error=str(e))
+
+async def record_alerts_removed(db: AsyncIOMotorDatabase, filter_dict: Dict[str, Any]) -> None:
+    """Subtract open alerts matching ``filter_dict``; call before deleting them"""
+    try:
+        pending = await db.alerts.count_documents({**filter_dict, "resolved": False})
+        await _apply_totals_delta(db, {"pending_alerts": -pending})
+    except Exception as e:
+        logger.error("Error updating alert rollups", error=str(e))
+
+async def rebuild_dashboard_rollups(db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+    """Recompute every rollup document from the source collections"""
+    counts_pipeline = [
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]
+    monthly_pipeline = [
+        {"$match": {"type": {"$in": ["income", "expense"]}, "date": {"$type": "date"}}},
+        {
+            "$group": {
+                "_id": {"year": {"$year": "$date"}, "month": {"$month": "$date"}},
+                "income": {"$sum": {"$cond": [{"$eq": ["$type", "income"]}, "$amount", 0]}},
+                "expense": {"$sum": {"$cond": [{"$eq": ["$type", "expense"]}, "$amount", 0]}}
+            }
+        }
+    ]
+    property_rows, active_tenants, pending_alerts, monthly_rows = await asyncio.gather(
+        db.properties.aggregate(counts_pipeline).to_list(None),
+        db.tenants.count_documents({"status": "active"}),
+        db.alerts.count_documents({"resolved": False}),
+        db.transactions.aggregate(monthly_pipeline).to_list(None)
+    )
+
+    by_status = {row["_id"]: row["count"] for row in property_rows}
+    now = datetime.now()
+    totals = {
+        "total_properties": sum(by_status.values()),
+        "occupied_properties": by_status.get("rented", 0),
+        "vacant_properties": by_status.get("vacant", 0),
+        "active_tenants": active_tenants,
+        "pending_alerts": pending_alerts,
+        "updated_at": now,
+    }
+
+    collection = db[ROLLUPS_COLLECTION]
+    await collection.replace_one({"_id": TOTALS_ID}, totals, upsert=True)
+
+    month_keys: List[str] = []
+    operations = []
+    for row in monthly_rows:
+        year, month = row["_id"]["year"], row["_id"]["month"]
+        key = f"{year:04d}-{month:02d}"
+        month_keys.append(key)
+        operations.append(UpdateOne(
+            {"_id": key},
+            {"$set": {
+                "year": year,
+                "month": month,
+                "income": row["income"],
+                "expense": row["expense"],
+                "updated_at": now
+            }},
+            upsert=True
+        ))
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+    await collection.delete_many({"_id": {"$nin": month_keys + [TOTALS_ID]}})
+
+    logger.info("Dashboard rollups rebuilt", months=len(month_keys))
+    return {"totals": totals, "months": len(month_keys)}
+
+async def rebuild_ledger(db: AsyncIOMotorDatabase, batch_size: int = LEDGER_REBUILD_BATCH_SIZE) -> Dict[str, Any]:
+    """Recompute ``ledger_monthly`` from the transactions
+
+    The aggregation result is streamed and written in batches, so the rebuild
+    holds one batch of ledger documents in memory at a time.
+    """
+    pipeline = [
+        {"$match": {"type": {"$in": ["income", "expense"]}, "date": {"$type": "date"}}},
+        {
+            "$group": {
+                "_id": {
+                    "property_id": "$property_id",
+                    "year": {"$year": "$date"},
+                    "month": {"$month": "$date"},
+                    "type": "$type",
+                    "category": "$category"
+                },
+                "total": {"$sum": "$amount"}
+            }
+        },
+        {
+            "$group": {
+                "_id": {"property_id": "$_id.property_id", "year": "$_id.year", "month": "$_id.month"},
+                "totals": {"$push": {"type": "$_id.type", "category": "$_id.category", "total": "$total"}}
+            }
+        }
+    ]
+    collection = db[LEDGER_COLLECTION]
+    started = datetime.now()
+
+    documents = 0
+    operations: List[UpdateOne] = []
+    async for row in db.transactions.aggregate(pipeline, allowDiskUse=True):
+        ledger: Dict[str, Any] = {"income": 0, "expense": 0, "by_category": {"income": {}, "expense": {}}}
+        for entry in row["totals"]:
+            ledger[entry["type"]] += entry["total"]
+            # None, "" and "uncategorized" are grouped apart but share a field
+            field = category_field(entry.get("category") or "uncategorized")
+            categories = ledger["by_category"][entry["type"]]
+            categories[field] = categories.get(field, 0) + entry["total"]
+        operations.append(UpdateOne(
+            dict(row["_id"]),
+            {"$set": {**ledger, "updated_at": datetime.now()}},
+            upsert=True
+        ))
+        documents += 1
+        if len(operations) >= batch_size:
+            await collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+
+    # Months that no longer have transactions were not rewritten above
+    removed = await collection.delete_many({"updated_at": {"$lt": started}})
+
+    logger.info("Ledger rebuilt", documents=documents, removed=removed.deleted_count)
+    return {"documents": documents, "removed": removed.deleted_count}
+
+def _ledger_category_entries(transaction_type: str) -> Dict[str, Any]:
+    return {
+        "$map": {
+            "input": {"$objectToArray": {"$ifNull": [f"$by_category.{transaction_type}", {}]}},
+            "as": "entry",
+            "in": {"type": transaction_type, "category": "$$entry.k", "total": "$$entry.v"}
+        }
+    }
+
+def _round_totals(row: Dict[str, Any]) -> Dict[str, Any]:
+    income, expense = round(row.get("income", 0), 2), round(row.get("expense", 0), 2)
+    return {"income": income, "expense": expense, "net": round(income - expense, 2)}
+
+async def get_ledger_report(
+    db: AsyncIOMotorDatabase,
+    start: Tuple[int, int],
+    end: Tuple[int, int],
+    property_id: Optional[str] = None,
+    group_by: str = "month",
+    include_categories: bool = True
+) -> Dict[str, Any]:
+    """Profit and loss per month or year between two (year, month) periods
+
+    Read from ``ledger_monthly`` only: one aggregation sums the ledger
+    documents in range, with a ``$facet`` branch for the category totals.
+    """
+    match: Dict[str, Any] = {"year": {"$gte": start[0], "$lte": end[0]}}
+    if property_id:
+        match["property_id"] = property_id
+    period = {"$add": [{"$multiply": ["$year", 12]}, "$month"]}
+    group_key = {"year": "$year", "month": "$month"} if group_by == "month" else {"year": "$year"}
+
+    facets: Dict[str, List[Dict[str, Any]]] = {
+        "periods": [
+            {"$group": {"_id": group_key, "income": {"$sum": "$income"}, "expense": {"$sum": "$expense"}}}
+        ]
+    }
+    if include_categories:
+        facets["categories"] = [
+            {
+                "$project": {
+                    "_id": 0, "year": 1, "month": 1,
+                    "entries": {"$concatArrays": [
+                        _ledger_category_entries("income"), _ledger_category_entries("expense")
+                    ]}
+                }
+            },
+            {"$unwind": "$entries"},
+            {
+                "$group": {
+                    "_id": {**group_key, "type": "$entries.type", "category": "$entries.category"},
+                    "total": {"$sum": "$entries.total"}
+                }
+            }
+        ]
+    pipeline = [
+        {"$match": match},
+        {"$match": {"$expr": {"$and": [
+            {"$gte": [period, start[0] * 12 + start[1]]},
+            {"$lte": [period, end[0] * 12 + end[1]]}
+        ]}}},
+        {"$facet": facets}
+    ]
+    result = (await db[LEDGER_COLLECTION].aggregate(pipeline).to_list(1))[0]
+
+    def label(key: Dict[str, Any]) -> str:
+        return f"{key['year']:04d}-{key['month']:02d}" if group_by == "month" else f"{key['year']:04d}"
+
+    # Sums of $inc deltas can leave float dust on categories that netted out
+    categories: Dict[str, Dict[str, Dict[str, float]]] = defaultdict(lambda: {"income": {}, "expense": {}})
+    category_totals: Dict[str, Dict[str, float]] = {"income": defaultdict(float), "expense": defaultdict(float)}
+    for row in result.get("categories", []):
+        total = round(row["total"], 2)
+        if total:
+            name = category_name(row["_id"]["category"])
+            categories[label(row["_id"])][row["_id"]["type"]][name] = total
+            category_totals[row["_id"]["type"]][name] += total
+
+    periods = []
+    income = expense = 0.0
+    for row in sorted(result["periods"], key=lambda row: label(row["_id"])):
+        entry = {"period": label(row["_id"]), **row["_id"], **_round_totals(row)}
+        if include_categories:
+            entry["by_category"] = categories[entry["period"]]
+        periods.append(entry)
+        income += row["income"]
+        expense += row["expense"]
+
+    totals = _round_totals({"income": income, "expense": expense})
+    if include_categories:
+        totals["by_category"] = {
+            transaction_type: {name: round(total, 2) for name, total in sorted(by_name.items())}
+            for transaction_type, by_name in category_totals.items()
+        }
+    return {
+        "start": f"{start[0]:04d}-{start[1]:02d}",
+        "end": f"{end[0]:04d}-{end[1]:02d}",
+        "group_by": group_by,
+        "property_id": property_id,
+        "periods": periods,
+        "totals": totals
+    }
+
+async def get_dashboard_summary_from_rollups(db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+    """Dashboard summary read from the rollup documents
+
+    Falls back to computing the summary from source collections when the
+    rollups have never been built.
+    """
+    month_start, _ = get_month_range()
+    collection = db[ROLLUPS_COLLECTION]
+    totals, monthly, recent_transactions = await asyncio.gather(
+        collection.find_one({"_id": TOTALS_ID}),
+        collection.find_one({"_id": month_key(month_start)}),
+        db.transactions.find({}).sort("created_at", -1).limit(5).to_list(5)
+    )
+
+    if totals is None:
+        logger.info("Dashboard rollups missing, computing summary from source")
+        return await calculate_dashboard_summary(db)
+
+    monthly = monthly or {}
+    return {
+        "total_properties": totals.get("total_properties", 0),
+        "total_tenants": totals.get("active_tenants", 0),
+        "occupied_properties": totals.get("occupied_properties", 0),
+        "vacant_properties": totals.get("vacant_properties", 0),
+        "total_monthly_income": monthly.get("income", 0),
+        "total_monthly_expenses": monthly.get("expense", 0),
+        "pending_alerts": totals.get("pending_alerts", 0),
+        "recent_transactions": [convert_objectid_to_str(doc) for doc in recent_transactions]
+    }
@@ -0,0 +1,63 @@
+"""
+Administration routes for SISMOBI 3.2.0
+"""
+from datetime import datetime
+import json
+import zlib
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+import structlog
+
+from database import get_database
+from models import User
+from auth import get_current_admin_user
+from config import settings
+from backup import read_backup_header, read_backup_lines, restore_backup, stream_backup
+
+logger = structlog.get_logger(__name__)
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.get("/backup")
+async def download_backup(
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Stream a gzip-compressed NDJSON backup of all collections"""
+    filename = f"sismobi-backup-{datetime.now():%Y%m%d-%H%M%S}.ndjson.gz"
+    logger.info("Backup requested", user=current_user.email)
+    return StreamingResponse(
+        stream_backup(db),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/restore")
+async def restore(
+    backup: UploadFile = File(..., description="Archive produced by GET /admin/backup"),
+    mode: str = Query("merge", pattern="^(merge|replace)$",
+                      description="merge upserts by _id; replace empties the backed-up collections first"),
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Restore a backup, streaming NDJSON progress events as batches are written"""
+    try:
+        header = await read_backup_header(read_backup_lines(backup))
+    except (ValueError, zlib.error) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.info("Restore started", mode=mode, backup_created_at=str(header.get("created_at")),
+                user=current_user.email)
+
+    async def progress():
+        try:
+            async for event in restore_backup(db, header, backup, mode, settings.restore_batch_size):
+                yield json.dumps(event) + "\n"
+        except (ValueError, zlib.error) as e:
+            logger.error("Restore aborted", error=str(e), user=current_user.email)
+            yield json.dumps({"status": "failed", "error": str(e)}) + "\n"
+        except Exception as e:
+            logger.error("Error restoring backup", error=str(e), user=current_user.email)
+            yield json.dumps({"status": "failed", "error": "Internal server error"}) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
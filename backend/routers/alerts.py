@@ -4,11 +4,16 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 
 from database import get_database
 from models import Alert, AlertCreate, AlertUpdate
-from utils import convert_objectid_to_str
+from utils import convert_objectid_to_str, get_document_count, build_projection, invalidate_count_cache, get_priority_score
 from auth import get_current_user
+from references import check_references
+from responses import APIJSONResponse
+from rollups import record_alert_change
+from alert_jobs import ALERT_LIST_SORT, priority_score_expression, run_automatic_alerts, run_consumption_alerts
 
 router = APIRouter(
     prefix="/alerts",
@@ -20,17 +25,21 @@ router = APIRouter(
 async def get_alerts(
     skip: int = Query(0, ge=0, description="Number of alerts to skip"),
     limit: int = Query(100, ge=1, le=100, description="Maximum number of alerts to return"),
+    include_total: bool = Query(True, description="Include the total count (disable for infinite scroll)"),
     property_id: Optional[str] = Query(None, description="Filter by property ID"),
     tenant_id: Optional[str] = Query(None, description="Filter by tenant ID"),
     type: Optional[str] = Query(None, description="Filter by alert type"),
     priority: Optional[str] = Query(None, description="Filter by priority (low/medium/high/critical)"),
     resolved: Optional[bool] = Query(None, description="Filter by resolved status"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included)"),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """
     Get all alerts with optional filtering and pagination
     """
     try:
+        projection = build_projection(fields)
+
         # Build filter query
         filter_query = {}
         if property_id:
@@ -44,35 +53,31 @@ async def get_alerts(
         if resolved is not None:
             filter_query["resolved"] = resolved
 
-        # Get alerts with filters, sort by priority and creation date
-        priority_order = {"critical": 1, "high": 2, "medium": 3, "low": 4}
-        cursor = db.alerts.find(filter_query).skip(skip).limit(limit)
+        # Unresolved first, then priority, then newest; served by the
+        # (resolved, priority_score, created_at) index
+        cursor = db.alerts.find(filter_query, projection).sort(ALERT_LIST_SORT).skip(skip).limit(limit + 1)
         
         alerts = []
         async for alert in cursor:
-            clean_alert = convert_objectid_to_str(alert)
-            # Add priority score for frontend sorting if needed
-            clean_alert["priority_score"] = priority_order.get(clean_alert.get("priority", "medium"), 3)
-            alerts.append(clean_alert)
-
-        # Sort by resolved status (unresolved first), then priority, then date
-        alerts.sort(key=lambda x: (
-            x.get("resolved", False),  # Unresolved first
-            x.get("priority_score", 3),  # Higher priority first
-            -(x.get("created_at", datetime.now()).timestamp() if isinstance(x.get("created_at"), datetime) else 0)  # Newer first
-        ))
-
-        # Get total count for pagination
-        total = await db.alerts.count_documents(filter_query)
-
-        return {
+            alerts.append(convert_objectid_to_str(alert))
+
+        # One extra document tells whether more exist without a count
+        has_more = len(alerts) > limit
+        alerts = alerts[:limit]
+
+        # Get total count for pagination (cached, and only when requested)
+        total = await get_document_count(db.alerts, filter_query) if include_total else None
+
+        return APIJSONResponse({
             "items": alerts,
             "total": total,
             "skip": skip,
             "limit": limit,
-            "has_more": skip + limit < total
-        }
+            "has_more": has_more
+        })
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -97,36 +102,30 @@ async def create_alert(
             alert_dict["id"] = str(uuid.uuid4())
         
         # Set timestamps
-        from datetime import datetime
         alert_dict["created_at"] = datetime.now()
         alert_dict["updated_at"] = datetime.now()
         
-        # Verify property exists if provided
-        if alert_dict.get("property_id"):
-            property_doc = await db.properties.find_one({"id": alert_dict["property_id"]})
-            if not property_doc:
-                raise HTTPException(status_code=400, detail="Property not found")
-
-        # Verify tenant exists if provided
-        if alert_dict.get("tenant_id"):
-            tenant_doc = await db.tenants.find_one({"id": alert_dict["tenant_id"]})
-            if not tenant_doc:
-                raise HTTPException(status_code=400, detail="Tenant not found")
+        # Verify the referenced property and tenant exist if provided
+        reference_error = await check_references(db, alert_dict.get("property_id"), alert_dict.get("tenant_id"))
+        if reference_error:
+            raise HTTPException(status_code=400, detail=reference_error)
 
         # Validate priority
         valid_priorities = ["low", "medium", "high", "critical"]
         if alert_dict.get("priority") not in valid_priorities:
             alert_dict["priority"] = "medium"
+        alert_dict["priority_score"] = get_priority_score(alert_dict["priority"])
 
         # Insert alert
         result = await db.alerts.insert_one(alert_dict)
+        invalidate_count_cache("alerts")
         
         if not result.inserted_id:
             raise HTTPException(status_code=500, detail="Failed to create alert")
 
-        # Fetch and return the created alert
-        created_alert = await db.alerts.find_one({"_id": result.inserted_id})
-        return convert_objectid_to_str(created_alert)
+        await record_alert_change(db, None, alert_dict)
+
+        return convert_objectid_to_str(alert_dict)
 
     except HTTPException:
         raise
@@ -136,6 +135,41 @@ async def create_alert(
             detail=f"Error creating alert: {str(e)}"
         )
 
+@router.post("/generate", response_model=dict)
+async def generate_alerts(
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Generate rent alerts for the current month and persist them idempotently
+    """
+    try:
+        return await run_automatic_alerts(db)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating alerts: {str(e)}"
+        )
+
+@router.post("/generate/consumption", response_model=dict)
+async def generate_consumption_alerts(
+    year: Optional[int] = Query(None, ge=2000, le=3000, description="Billing year (default: current)"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Billing month (default: current)"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Flag properties whose energy or water consumption for a month is far
+    above their rolling baseline, persisting the alerts idempotently
+    """
+    try:
+        return await run_consumption_alerts(db, year, month)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating consumption alerts: {str(e)}"
+        )
+
 @router.get("/{alert_id}", response_model=dict)
 async def get_alert(
     alert_id: str,
@@ -170,52 +204,51 @@ async def update_alert(
     Update a specific alert
     """
     try:
-        # Check if alert exists
-        existing_alert = await db.alerts.find_one({"id": alert_id})
-        if not existing_alert:
-            raise HTTPException(status_code=404, detail="Alert not found")
-
         # Prepare update data (exclude None values)
         update_data = {k: v for k, v in alert_update.dict().items() if v is not None}
         
         if not update_data:
             raise HTTPException(status_code=400, detail="No data provided for update")
 
-        # Verify property exists if being updated
-        if "property_id" in update_data and update_data["property_id"]:
-            property_doc = await db.properties.find_one({"id": update_data["property_id"]})
-            if not property_doc:
-                raise HTTPException(status_code=400, detail="Property not found")
-
-        # Verify tenant exists if being updated
-        if "tenant_id" in update_data and update_data["tenant_id"]:
-            tenant_doc = await db.tenants.find_one({"id": update_data["tenant_id"]})
-            if not tenant_doc:
-                raise HTTPException(status_code=400, detail="Tenant not found")
+        # Verify the property and tenant exist if being updated
+        reference_error = await check_references(db, update_data.get("property_id"), update_data.get("tenant_id"))
+        if reference_error:
+            raise HTTPException(status_code=400, detail=reference_error)
 
         # Validate priority if being updated
         if "priority" in update_data:
             valid_priorities = ["low", "medium", "high", "critical"]
             if update_data["priority"] not in valid_priorities:
                 update_data["priority"] = "medium"
-
-        # Handle alert resolution
-        if "resolved" in update_data and update_data["resolved"] and not existing_alert.get("resolved"):
-            update_data["resolved_at"] = datetime.now()
+            update_data["priority_score"] = get_priority_score(update_data["priority"])
+
+        # Handle alert resolution; resolving an already resolved alert keeps
+        # its original resolved_at, decided server-side against the stored value
+        update_fields = {field: {"$literal": value} for field, value in update_data.items()}
+        now = datetime.now()
+        if "resolved" in update_data and update_data["resolved"]:
+            update_fields["resolved_at"] = {"$cond": [{"$eq": ["$resolved", True]}, "$resolved_at", now]}
         elif "resolved" in update_data and not update_data["resolved"]:
-            update_data["resolved_at"] = None
+            update_fields["resolved_at"] = None
 
-        # Update alert
-        result = await db.alerts.update_one(
+        # Update alert, keeping the previous version for the rollups
+        existing_alert = await db.alerts.find_one_and_update(
             {"id": alert_id},
-            {"$set": update_data}
+            [{"$set": update_fields}],
+            return_document=ReturnDocument.BEFORE
         )
-
-        if result.matched_count == 0:
+        if not existing_alert:
             raise HTTPException(status_code=404, detail="Alert not found")
 
-        # Fetch and return updated alert
-        updated_alert = await db.alerts.find_one({"id": alert_id})
+        invalidate_count_cache("alerts")
+        updated_alert = {**existing_alert, **update_data}
+        if "resolved" in update_data:
+            was_resolved = existing_alert.get("resolved") is True
+            updated_alert["resolved_at"] = (
+                (existing_alert.get("resolved_at") if was_resolved else now) if update_data["resolved"] else None
+            )
+        await record_alert_change(db, existing_alert, updated_alert)
+
         return convert_objectid_to_str(updated_alert)
 
     except HTTPException:
@@ -235,11 +268,14 @@ async def delete_alert(
     Delete a specific alert
     """
     try:
-        result = await db.alerts.delete_one({"id": alert_id})
+        deleted_alert = await db.alerts.find_one_and_delete({"id": alert_id})
+        invalidate_count_cache("alerts")
         
-        if result.deleted_count == 0:
+        if not deleted_alert:
             raise HTTPException(status_code=404, detail="Alert not found")
 
+        await record_alert_change(db, deleted_alert, None)
+
         return
 
     except HTTPException:
@@ -259,27 +295,24 @@ async def resolve_alert(
     Mark an alert as resolved (convenience endpoint)
     """
     try:
-        # Check if alert exists
-        existing_alert = await db.alerts.find_one({"id": alert_id})
-        if not existing_alert:
-            raise HTTPException(status_code=404, detail="Alert not found")
-
         # Update alert to resolved
-        update_data = {
-            "resolved": True,
-            "resolved_at": datetime.now()
-        }
-
-        result = await db.alerts.update_one(
+        update_data = {"resolved": True, "resolved_at": datetime.now()}
+        existing_alert = await db.alerts.find_one_and_update(
             {"id": alert_id},
-            {"$set": update_data}
+            [{"$set": {**update_data, "priority_score": priority_score_expression()}}],
+            return_document=ReturnDocument.BEFORE
         )
-
-        if result.matched_count == 0:
+        if not existing_alert:
             raise HTTPException(status_code=404, detail="Alert not found")
 
-        # Fetch and return updated alert
-        updated_alert = await db.alerts.find_one({"id": alert_id})
+        invalidate_count_cache("alerts")
+        updated_alert = {
+            **existing_alert,
+            **update_data,
+            "priority_score": get_priority_score(existing_alert.get("priority"))
+        }
+        await record_alert_change(db, existing_alert, updated_alert)
+
         return convert_objectid_to_str(updated_alert)
 
     except HTTPException:
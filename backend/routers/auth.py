@@ -2,26 +2,48 @@
 Authentication routes for SISMOBI 3.2.0
 """
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from motor.motor_asyncio import AsyncIOMotorDatabase
 import structlog
 
 from database import get_database
-from models import Token, User, UserCreate, UserResponse, MessageResponse
-from auth import authenticate_user, create_access_token, create_user, get_current_active_user
+from models import Token, User, UserCreate, UserResponse, MessageResponse, RefreshTokenRequest
+from auth import (
+    authenticate_user, build_access_token_claims, create_access_token, create_user,
+    get_cached_user_by_email, get_current_active_user, get_current_admin_user, get_password_hashing_stats,
+    issue_refresh_token, rotate_refresh_token, PasswordHashingBusyError
+)
+from ratelimit import (
+    enforce_rate_limits, get_client_ip, login_email_limiter, login_ip_limiter,
+    register_ip_limiter, too_many_requests
+)
 from config import settings
 
 logger = structlog.get_logger(__name__)
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+def _create_user_access_token(user: User) -> str:
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
+    return create_access_token(
+        data=build_access_token_claims(user), expires_delta=access_token_expires
+    )
+
 @router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Login endpoint to get access token"""
-    user = await authenticate_user(db, form_data.username, form_data.password)
+    await enforce_rate_limits(
+        (login_ip_limiter, get_client_ip(request)),
+        (login_email_limiter, form_data.username.strip().lower())
+    )
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except PasswordHashingBusyError:
+        raise too_many_requests(1)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -29,28 +51,62 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
+    access_token = _create_user_access_token(user)
+    refresh_token = await issue_refresh_token(db, user)
     
     logger.info("User logged in successfully", email=user.email)
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+    request: RefreshTokenRequest,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Exchange a refresh token for a new access token and a rotated refresh token"""
+    rotated = await rotate_refresh_token(db, request.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user, refresh_token = rotated
+    logger.info("Access token refreshed", email=user.email)
+    return {
+        "access_token": _create_user_access_token(user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token
+    }
 
 @router.post("/register", response_model=MessageResponse)
 async def register(
+    request: Request,
     user_data: UserCreate,
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Register new user"""
-    await create_user(db, user_data.email, user_data.password, user_data.full_name)
+    await enforce_rate_limits((register_ip_limiter, get_client_ip(request)))
+    try:
+        await create_user(db, user_data.email, user_data.password, user_data.full_name)
+    except PasswordHashingBusyError:
+        raise too_many_requests(1)
     
     logger.info("User registered successfully", email=user_data.email)
     return {"message": "User registered successfully", "status": "success"}
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+async def read_users_me(
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
     """Get current user information"""
+    # Stateless tokens only carry the claims get_current_user needs, so the
+    # profile (timestamps included) comes from the stored user
+    current_user = await get_cached_user_by_email(db, current_user.email)
+    if current_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
     # Return safe user data without hashed_password
     return UserResponse(
         id=current_user.id,
@@ -64,4 +120,9 @@ async def read_users_me(current_user: User = Depends(get_current_active_user)):
 @router.get("/verify", response_model=MessageResponse)
 async def verify_token(current_user: User = Depends(get_current_active_user)):
     """Verify if token is valid"""
-    return {"message": "Token is valid", "status": "success"}
\ No newline at end of file
+    return {"message": "Token is valid", "status": "success"}
+
+@router.get("/metrics/password-hashing", response_model=dict)
+async def password_hashing_metrics(current_user: User = Depends(get_current_admin_user)):
+    """Load of the password hashing pool (workers, in-flight and queued operations)"""
+    return get_password_hashing_stats()
@@ -0,0 +1,291 @@
+# Energy Bills API Router - SISMOBI Backend v3.2.0
+
+from fastapi import APIRouter, HTTPException, Depends, File, Query, UploadFile
+from typing import Any, Dict, Optional
+from datetime import datetime
+import time
+import uuid
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from config import settings
+from database import get_database
+from models import EnergyBillCreate, EnergyBillUpdate
+from utils import convert_objectid_to_str, get_document_count, invalidate_count_cache, build_projection
+from auth import get_current_user
+from references import check_references
+from responses import APIJSONResponse
+from ingestion import detect_format, import_bills
+from allocations import allocate_energy_bills, has_energy_allocation_inputs
+
+router = APIRouter(
+    prefix="/energy-bills",
+    tags=["energy-bills"],
+    dependencies=[Depends(get_current_user)]  # Require authentication
+)
+
+ALLOCATION_FIELDS = ("total_amount", "total_kwh", "meter_consumptions", "residual_receiver")
+
+@router.get("/", response_model=dict)
+async def get_energy_bills(
+    skip: int = Query(0, ge=0, description="Number of bills to skip"),
+    limit: int = Query(100, ge=1, le=100, description="Maximum number of bills to return"),
+    include_total: bool = Query(True, description="Include the total count (disable for infinite scroll)"),
+    property_id: Optional[str] = Query(None, description="Filter by property ID"),
+    group_id: Optional[str] = Query(None, description="Filter by meter group ID"),
+    year: Optional[int] = Query(None, ge=2000, le=3000, description="Filter by billing year"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Filter by billing month"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included)"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Get energy bills with optional filtering and pagination, newest period first
+    """
+    try:
+        projection = build_projection(fields)
+
+        # Build filter query
+        filter_query = {}
+        if property_id:
+            filter_query["property_id"] = property_id
+        if group_id:
+            filter_query["group_id"] = group_id
+        if year:
+            filter_query["year"] = year
+        if month:
+            filter_query["month"] = month
+
+        cursor = db.energy_bills.find(filter_query, projection).sort(
+            [("year", -1), ("month", -1), ("id", 1)]
+        ).skip(skip).limit(limit + 1)
+        bills = [convert_objectid_to_str(bill) async for bill in cursor]
+
+        # One extra document tells whether more exist without a count
+        has_more = len(bills) > limit
+        bills = bills[:limit]
+
+        total = await get_document_count(db.energy_bills, filter_query) if include_total else None
+
+        return APIJSONResponse({
+            "items": bills,
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "has_more": has_more
+        })
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching energy bills: {str(e)}"
+        )
+
+@router.post("/", response_model=dict, status_code=201)
+async def create_energy_bill(
+    bill: EnergyBillCreate,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Create an energy bill; tenant allocations are computed from the meter
+    consumptions when those are given
+    """
+    try:
+        reference_error = await check_references(db, property_id=bill.property_id)
+        if reference_error:
+            raise HTTPException(status_code=400, detail=reference_error)
+
+        bill_dict = bill.dict()
+        if has_energy_allocation_inputs(bill_dict):
+            bill_dict["tenant_allocations"] = allocate_energy_bills([bill_dict])[0]
+        bill_dict["id"] = str(uuid.uuid4())
+        bill_dict["created_at"] = datetime.now()
+        bill_dict["updated_at"] = datetime.now()
+
+        await db.energy_bills.insert_one(bill_dict)
+        invalidate_count_cache("energy_bills")
+
+        return convert_objectid_to_str(bill_dict)
+
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="An energy bill already exists for this group and period")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error creating energy bill: {str(e)}"
+        )
+
+@router.post("/import", response_model=dict)
+async def import_energy_bills(
+    file: UploadFile = File(..., description="CSV or XLSX file with one bill per row"),
+    format: Optional[str] = Query(None, pattern="^(csv|xlsx)$", description="File format (default: from the file name)"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Import energy bills from a spreadsheet, upserting one bill per
+    (property, group, year, month) and reporting invalid rows
+    """
+    try:
+        file_format = detect_format(file.filename, format)
+        return await import_bills(db, "energy", file.file, file_format, settings.import_chunk_size)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error importing energy bills: {str(e)}"
+        )
+
+@router.post("/reallocate", response_model=dict)
+async def reallocate_energy_bills(
+    year: int = Query(..., ge=2000, le=3000, description="Billing year"),
+    month: int = Query(..., ge=1, le=12, description="Billing month"),
+    group_id: Optional[str] = Query(None, description="Only bills of this meter group"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Recompute tenant allocations for every bill of a month in one pass
+    """
+    try:
+        filter_query: Dict[str, Any] = {
+            "year": year,
+            "month": month,
+            "$or": [
+                {"meter_consumptions": {"$exists": True, "$ne": {}}},
+                {"residual_receiver": {"$nin": [None, ""]}},
+            ],
+        }
+        if group_id:
+            filter_query["group_id"] = group_id
+
+        projection = {"_id": 0, "id": 1, "tenant_allocations": 1, **{field: 1 for field in ALLOCATION_FIELDS}}
+        bills = await db.energy_bills.find(filter_query, projection).to_list(None)
+
+        started = time.perf_counter()
+        allocations = allocate_energy_bills(bills)
+        allocation_ms = (time.perf_counter() - started) * 1000
+
+        now = datetime.now()
+        operations = [
+            UpdateOne({"id": bill["id"]}, {"$set": {"tenant_allocations": allocation, "updated_at": now}})
+            for bill, allocation in zip(bills, allocations)
+            if allocation != bill.get("tenant_allocations")
+        ]
+        if operations:
+            await db.energy_bills.bulk_write(operations, ordered=False)
+
+        return {
+            "bills": len(bills),
+            "updated": len(operations),
+            "allocation_ms": round(allocation_ms, 3)
+        }
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reallocating energy bills: {str(e)}"
+        )
+
+@router.get("/{bill_id}", response_model=dict)
+async def get_energy_bill(
+    bill_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Get a specific energy bill by ID
+    """
+    try:
+        bill = await db.energy_bills.find_one({"id": bill_id})
+
+        if not bill:
+            raise HTTPException(status_code=404, detail="Energy bill not found")
+
+        return convert_objectid_to_str(bill)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching energy bill: {str(e)}"
+        )
+
+@router.put("/{bill_id}", response_model=dict)
+async def update_energy_bill(
+    bill_id: str,
+    bill_update: EnergyBillUpdate,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Update a specific energy bill, recomputing allocations when their inputs change
+    """
+    try:
+        # Prepare update data (exclude None values)
+        update_data = {k: v for k, v in bill_update.dict().items() if v is not None}
+
+        if not update_data:
+            raise HTTPException(status_code=400, detail="No data provided for update")
+
+        update_data["updated_at"] = datetime.now()
+
+        if not any(field in update_data for field in ALLOCATION_FIELDS):
+            updated_bill = await db.energy_bills.find_one_and_update(
+                {"id": bill_id},
+                {"$set": update_data},
+                return_document=ReturnDocument.AFTER
+            )
+            if not updated_bill:
+                raise HTTPException(status_code=404, detail="Energy bill not found")
+            return convert_objectid_to_str(updated_bill)
+
+        # Allocations depend on the stored values the update does not change
+        existing_bill = await db.energy_bills.find_one({"id": bill_id})
+        if not existing_bill:
+            raise HTTPException(status_code=404, detail="Energy bill not found")
+
+        updated_bill = {**existing_bill, **update_data}
+        if has_energy_allocation_inputs(updated_bill):
+            update_data["tenant_allocations"] = allocate_energy_bills([updated_bill])[0]
+            updated_bill["tenant_allocations"] = update_data["tenant_allocations"]
+
+        await db.energy_bills.update_one({"id": bill_id}, {"$set": update_data})
+
+        return convert_objectid_to_str(updated_bill)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error updating energy bill: {str(e)}"
+        )
+
+@router.delete("/{bill_id}", status_code=204)
+async def delete_energy_bill(
+    bill_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Delete a specific energy bill
+    """
+    try:
+        result = await db.energy_bills.delete_one({"id": bill_id})
+
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Energy bill not found")
+
+        invalidate_count_cache("energy_bills")
+        return
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error deleting energy bill: {str(e)}"
+        )
@@ -1,15 +1,28 @@
 """
 Property management routes for SISMOBI 3.2.0
 """
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+import uuid
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Query
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 import structlog
 
 from database import get_database
-from models import Property, PropertyCreate, PropertyUpdate, MessageResponse, User
+from config import settings
+from models import Property, PropertyCreate, PropertyUpdate, MessageResponse, User, BulkCreateResponse
 from auth import get_current_active_user
-from utils import get_paginated_results, convert_objectid_to_str, create_property_filter
+from utils import (
+    get_paginated_results, convert_objectid_to_str, create_property_filter, invalidate_count_cache,
+    validate_bulk_items, insert_many_unordered, build_bulk_response
+)
+from references import invalidate_reference
+from responses import APIJSONResponse
+from rollups import (
+    LEDGER_COLLECTION, record_property_change, record_property_changes, record_transactions_removed,
+    record_alerts_removed
+)
 
 logger = structlog.get_logger(__name__)
 router = APIRouter(prefix="/properties", tags=["properties"])
@@ -18,10 +31,13 @@ router = APIRouter(prefix="/properties", tags=["properties"])
 async def get_properties(
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque next_cursor from a previous page (keyset pagination)"),
+    include_total: Optional[bool] = Query(None, description="Include total_count (defaults to true without a cursor)"),
     status: Optional[str] = Query(None),
     min_rent: Optional[float] = Query(None, ge=0),
     max_rent: Optional[float] = Query(None, ge=0),
     property_type: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included)"),
     current_user: User = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
@@ -29,12 +45,15 @@ async def get_properties(
     try:
         filter_dict = create_property_filter(status, min_rent, max_rent, property_type)
         result = await get_paginated_results(
-            db.properties, filter_dict, page, page_size, "created_at", -1
+            db.properties, filter_dict, page, page_size, "created_at", -1,
+            cursor=cursor, include_total=include_total, fields=fields
         )
         
         logger.info("Properties retrieved", count=len(result["items"]), user=current_user.email)
-        return result
+        return APIJSONResponse(result)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error("Error retrieving properties", error=str(e), user=current_user.email)
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -71,8 +90,6 @@ async def create_property(
     try:
         # Convert to dict and add metadata
         property_dict = property_data.dict()
-        from datetime import datetime
-        import uuid
         
         property_dict.update({
             "id": str(uuid.uuid4()),
@@ -81,10 +98,11 @@ async def create_property(
             "tenant_id": None
         })
         
-        result = await db.properties.insert_one(property_dict)
-        created_property = await db.properties.find_one({"_id": result.inserted_id})
+        await db.properties.insert_one(property_dict)
+        invalidate_count_cache("properties")
+        await record_property_change(db, None, property_dict)
         
-        property_response = convert_objectid_to_str(created_property)
+        property_response = convert_objectid_to_str(property_dict)
         logger.info("Property created", property_id=property_response["id"], user=current_user.email)
         return Property(**property_response)
         
@@ -92,6 +110,45 @@ async def create_property(
         logger.error("Error creating property", error=str(e), user=current_user.email)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/bulk", response_model=BulkCreateResponse)
+async def create_properties_bulk(
+    items: List[Dict[str, Any]] = Body(..., min_length=1, max_length=settings.bulk_max_items),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Create many properties at once; each item is validated and reported separately"""
+    try:
+        valid, errors = validate_bulk_items(PropertyCreate, items)
+        
+        now = datetime.now()
+        positions = [position for position, _ in valid]
+        documents = [
+            {**property_data.dict(), "id": str(uuid.uuid4()), "created_at": now, "updated_at": now, "tenant_id": None}
+            for _, property_data in valid
+        ]
+        
+        write_errors = await insert_many_unordered(db.properties, documents)
+        created = {}
+        for offset, document in enumerate(documents):
+            if offset in write_errors:
+                errors[positions[offset]] = write_errors[offset]
+            else:
+                created[positions[offset]] = document["id"]
+        
+        if created:
+            invalidate_count_cache("properties")
+            await record_property_changes(db, [
+                (None, document) for offset, document in enumerate(documents) if offset not in write_errors
+            ])
+        
+        logger.info("Properties bulk created", created=len(created), failed=len(items) - len(created),
+                    user=current_user.email)
+        return build_bulk_response(len(items), created, errors)
+        
+    except Exception as e:
+        logger.error("Error bulk creating properties", error=str(e), user=current_user.email)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.put("/{property_id}", response_model=Property)
 async def update_property(
     property_id: str,
@@ -101,23 +158,29 @@ async def update_property(
 ):
     """Update existing property"""
     try:
-        # Check if property exists
-        existing_property = await db.properties.find_one({"id": property_id})
-        if not existing_property:
-            raise HTTPException(status_code=404, detail="Property not found")
-        
         # Prepare update data
         update_data = {k: v for k, v in property_updates.dict().items() if v is not None}
         if update_data:
-            from datetime import datetime
             update_data["updated_at"] = datetime.now()
             
-            await db.properties.update_one(
+            # The previous version feeds the rollups; the new one is the same
+            # document with the $set fields applied
+            existing_property = await db.properties.find_one_and_update(
                 {"id": property_id},
-                {"$set": update_data}
+                {"$set": update_data},
+                return_document=ReturnDocument.BEFORE
             )
+            if not existing_property:
+                raise HTTPException(status_code=404, detail="Property not found")
+            
+            updated_property = {**existing_property, **update_data}
+            invalidate_count_cache("properties")
+            await record_property_change(db, existing_property, updated_property)
+        else:
+            updated_property = await db.properties.find_one({"id": property_id})
+            if not updated_property:
+                raise HTTPException(status_code=404, detail="Property not found")
         
-        updated_property = await db.properties.find_one({"id": property_id})
         property_response = convert_objectid_to_str(updated_property)
         
         logger.info("Property updated", property_id=property_id, user=current_user.email)
@@ -142,15 +205,25 @@ async def delete_property(
         if not existing_property:
             raise HTTPException(status_code=404, detail="Property not found")
         
+        # Keep dashboard rollups in step with the cascade below
+        await record_transactions_removed(db, {"property_id": property_id})
+        await record_alerts_removed(db, {"property_id": property_id})
+        
         # Delete related data
         await db.transactions.delete_many({"property_id": property_id})
         await db.alerts.delete_many({"property_id": property_id})
         await db.documents.delete_many({"property_id": property_id})
         await db.energy_bills.delete_many({"property_id": property_id})
         await db.water_bills.delete_many({"property_id": property_id})
+        await db[LEDGER_COLLECTION].delete_many({"property_id": property_id})
         
         # Delete property
         await db.properties.delete_one({"id": property_id})
+        invalidate_reference("properties", property_id)
+        await record_property_change(db, existing_property, None)
+        invalidate_count_cache(
+            "properties", "transactions", "alerts", "documents", "energy_bills", "water_bills"
+        )
         
         logger.info("Property deleted", property_id=property_id, user=current_user.email)
         return {"message": "Property deleted successfully", "status": "success"}
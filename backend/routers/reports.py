@@ -0,0 +1,51 @@
+# Reports API Router - SISMOBI Backend v3.2.0
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from database import get_database
+from auth import get_current_user
+from rollups import get_ledger_report
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["reports"],
+    dependencies=[Depends(get_current_user)]  # Require authentication
+)
+
+PERIOD_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+def _parse_period(value: str) -> tuple:
+    year, month = value.split("-")
+    return int(year), int(month)
+
+@router.get("/ledger", response_model=dict)
+async def get_ledger(
+    start: Optional[str] = Query(None, pattern=PERIOD_PATTERN, description="First month, YYYY-MM (default: January of the end year)"),
+    end: Optional[str] = Query(None, pattern=PERIOD_PATTERN, description="Last month, YYYY-MM (default: current month)"),
+    property_id: Optional[str] = Query(None, description="Only this property (default: whole portfolio)"),
+    group_by: str = Query("month", pattern="^(month|year)$", description="Report per month or per year"),
+    include_categories: bool = Query(True, description="Include income and expense totals per category"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Profit and loss between two months, answered from the monthly ledger
+    without scanning transactions
+    """
+    try:
+        end_period = _parse_period(end) if end else (datetime.now().year, datetime.now().month)
+        start_period = _parse_period(start) if start else (end_period[0], 1)
+        if start_period > end_period:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+
+        return await get_ledger_report(db, start_period, end_period, property_id, group_by, include_categories)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error building ledger report: {str(e)}"
+        )
@@ -1,27 +1,56 @@
 """
 Tenant management routes for SISMOBI 3.2.0
 """
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Query
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
 import structlog
 import uuid
 
 from database import get_database
-from models import Tenant, TenantCreate, TenantUpdate, MessageResponse, User
+from config import settings
+from models import Tenant, TenantCreate, TenantUpdate, MessageResponse, User, BulkCreateResponse
 from auth import get_current_active_user
-from utils import get_paginated_results, convert_objectid_to_str, validate_property_exists
+from utils import (
+    get_paginated_results, convert_objectid_to_str, invalidate_count_cache,
+    validate_bulk_items, insert_many_unordered, build_bulk_response
+)
+from references import check_references, invalidate_reference
+from responses import APIJSONResponse
+from rollups import (
+    record_property_change, record_property_changes, record_tenant_change, record_tenant_changes,
+    record_transactions_removed, record_alerts_removed
+)
 
 logger = structlog.get_logger(__name__)
 router = APIRouter(prefix="/tenants", tags=["tenants"])
 
+async def _set_property_occupancy(
+    db: AsyncIOMotorDatabase,
+    property_id: str,
+    tenant_id: Optional[str]
+) -> None:
+    """Mark a property as rented by ``tenant_id``, or vacant when it is None"""
+    new_status = "rented" if tenant_id else "vacant"
+    previous = await db.properties.find_one_and_update(
+        {"id": property_id},
+        {"$set": {"status": new_status, "tenant_id": tenant_id, "updated_at": datetime.now()}},
+        projection={"_id": 0, "status": 1}
+    )
+    if previous is not None:
+        await record_property_change(db, previous, {**previous, "status": new_status})
+
 @router.get("/", response_model=dict)
 async def get_tenants(
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Opaque next_cursor from a previous page (keyset pagination)"),
+    include_total: Optional[bool] = Query(None, description="Include total_count (defaults to true without a cursor)"),
     status: Optional[str] = Query(None),
     property_id: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included)"),
     current_user: User = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
@@ -34,12 +63,15 @@ async def get_tenants(
             filter_dict["property_id"] = property_id
             
         result = await get_paginated_results(
-            db.tenants, filter_dict, page, page_size, "created_at", -1
+            db.tenants, filter_dict, page, page_size, "created_at", -1,
+            cursor=cursor, include_total=include_total, fields=fields
         )
         
         logger.info("Tenants retrieved", count=len(result["items"]), user=current_user.email)
-        return result
+        return APIJSONResponse(result)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error("Error retrieving tenants", error=str(e), user=current_user.email)
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -75,10 +107,9 @@ async def create_tenant(
     """Create new tenant"""
     try:
         # Validate property exists if provided
-        if tenant_data.property_id:
-            property_exists = await validate_property_exists(db, tenant_data.property_id)
-            if not property_exists:
-                raise HTTPException(status_code=400, detail="Property not found")
+        reference_error = await check_references(db, property_id=tenant_data.property_id)
+        if reference_error:
+            raise HTTPException(status_code=400, detail=reference_error)
         
         # Check for duplicate email
         existing_tenant = await db.tenants.find_one({"email": tenant_data.email})
@@ -93,17 +124,16 @@ async def create_tenant(
             "updated_at": datetime.now()
         })
         
-        result = await db.tenants.insert_one(tenant_dict)
-        created_tenant = await db.tenants.find_one({"_id": result.inserted_id})
+        await db.tenants.insert_one(tenant_dict)
         
         # Update property status if tenant is assigned
         if tenant_data.property_id:
-            await db.properties.update_one(
-                {"id": tenant_data.property_id},
-                {"$set": {"status": "rented", "tenant_id": tenant_dict["id"], "updated_at": datetime.now()}}
-            )
+            await _set_property_occupancy(db, tenant_data.property_id, tenant_dict["id"])
+        
+        invalidate_count_cache("tenants", "properties")
+        await record_tenant_change(db, None, tenant_dict)
         
-        tenant_response = convert_objectid_to_str(created_tenant)
+        tenant_response = convert_objectid_to_str(tenant_dict)
         logger.info("Tenant created", tenant_id=tenant_response["id"], user=current_user.email)
         return Tenant(**tenant_response)
         
@@ -113,6 +143,82 @@ async def create_tenant(
         logger.error("Error creating tenant", error=str(e), user=current_user.email)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.post("/bulk", response_model=BulkCreateResponse)
+async def create_tenants_bulk(
+    items: List[Dict[str, Any]] = Body(..., min_length=1, max_length=settings.bulk_max_items),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """Create many tenants at once; each item is validated and reported separately"""
+    try:
+        valid, errors = validate_bulk_items(TenantCreate, items)
+        
+        # One query each for the referenced properties and already registered emails
+        property_ids = list({tenant.property_id for _, tenant in valid if tenant.property_id})
+        properties = {}
+        if property_ids:
+            properties = {
+                doc["id"]: doc async for doc in db.properties.find(
+                    {"id": {"$in": property_ids}}, {"_id": 0, "id": 1, "status": 1}
+                )
+            }
+        emails = list({tenant.email for _, tenant in valid})
+        taken_emails = {
+            doc["email"] async for doc in db.tenants.find({"email": {"$in": emails}}, {"_id": 0, "email": 1})
+        }
+        
+        now = datetime.now()
+        positions: List[int] = []
+        documents: List[Dict[str, Any]] = []
+        for position, tenant in valid:
+            if tenant.property_id and tenant.property_id not in properties:
+                errors[position] = "Property not found"
+                continue
+            if tenant.email in taken_emails:
+                errors[position] = "Email already registered"
+                continue
+            taken_emails.add(tenant.email)
+            positions.append(position)
+            documents.append({**tenant.dict(), "id": str(uuid.uuid4()), "created_at": now, "updated_at": now})
+        
+        write_errors = await insert_many_unordered(db.tenants, documents)
+        created = {}
+        inserted: List[Dict[str, Any]] = []
+        for offset, document in enumerate(documents):
+            if offset in write_errors:
+                errors[positions[offset]] = write_errors[offset]
+            else:
+                created[positions[offset]] = document["id"]
+                inserted.append(document)
+        
+        if inserted:
+            # Later tenants win when several in the batch share a property,
+            # as they would with sequential single creates
+            occupants = {doc["property_id"]: doc["id"] for doc in inserted if doc.get("property_id")}
+            if occupants:
+                await db.properties.bulk_write([
+                    UpdateOne(
+                        {"id": property_id},
+                        {"$set": {"status": "rented", "tenant_id": tenant_id, "updated_at": now}}
+                    )
+                    for property_id, tenant_id in occupants.items()
+                ])
+                await record_property_changes(db, [
+                    (properties[property_id], {**properties[property_id], "status": "rented"})
+                    for property_id in occupants
+                ])
+            
+            invalidate_count_cache("tenants", "properties")
+            await record_tenant_changes(db, [(None, document) for document in inserted])
+        
+        logger.info("Tenants bulk created", created=len(created), failed=len(items) - len(created),
+                    user=current_user.email)
+        return build_bulk_response(len(items), created, errors)
+        
+    except Exception as e:
+        logger.error("Error bulk creating tenants", error=str(e), user=current_user.email)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.put("/{tenant_id}", response_model=Tenant)
 async def update_tenant(
     tenant_id: str,
@@ -122,26 +228,30 @@ async def update_tenant(
 ):
     """Update existing tenant"""
     try:
-        # Check if tenant exists
-        existing_tenant = await db.tenants.find_one({"id": tenant_id})
-        if not existing_tenant:
-            raise HTTPException(status_code=404, detail="Tenant not found")
-        
         # Validate new property if provided
-        if tenant_updates.property_id:
-            property_exists = await validate_property_exists(db, tenant_updates.property_id)
-            if not property_exists:
-                raise HTTPException(status_code=400, detail="Property not found")
+        reference_error = await check_references(db, property_id=tenant_updates.property_id)
+        if reference_error:
+            raise HTTPException(status_code=400, detail=reference_error)
         
         # Prepare update data
         update_data = {k: v for k, v in tenant_updates.dict().items() if v is not None}
         if update_data:
             update_data["updated_at"] = datetime.now()
             
-            await db.tenants.update_one(
+            existing_tenant = await db.tenants.find_one_and_update(
                 {"id": tenant_id},
-                {"$set": update_data}
+                {"$set": update_data},
+                return_document=ReturnDocument.BEFORE
             )
+            if not existing_tenant:
+                raise HTTPException(status_code=404, detail="Tenant not found")
+            
+            updated_tenant = {**existing_tenant, **update_data}
+            await record_tenant_change(db, existing_tenant, updated_tenant)
+        else:
+            existing_tenant = updated_tenant = await db.tenants.find_one({"id": tenant_id})
+            if not existing_tenant:
+                raise HTTPException(status_code=404, detail="Tenant not found")
         
         # Handle property updates
         old_property_id = existing_tenant.get("property_id")
@@ -150,19 +260,14 @@ async def update_tenant(
         if old_property_id != new_property_id:
             # Update old property status
             if old_property_id:
-                await db.properties.update_one(
-                    {"id": old_property_id},
-                    {"$set": {"status": "vacant", "tenant_id": None, "updated_at": datetime.now()}}
-                )
+                await _set_property_occupancy(db, old_property_id, None)
             
             # Update new property status
             if new_property_id:
-                await db.properties.update_one(
-                    {"id": new_property_id},
-                    {"$set": {"status": "rented", "tenant_id": tenant_id, "updated_at": datetime.now()}}
-                )
+                await _set_property_occupancy(db, new_property_id, tenant_id)
+        
+        invalidate_count_cache("tenants", "properties")
         
-        updated_tenant = await db.tenants.find_one({"id": tenant_id})
         tenant_response = convert_objectid_to_str(updated_tenant)
         
         logger.info("Tenant updated", tenant_id=tenant_id, user=current_user.email)
@@ -189,10 +294,11 @@ async def delete_tenant(
         
         # Update property status if tenant was assigned
         if existing_tenant.get("property_id"):
-            await db.properties.update_one(
-                {"id": existing_tenant["property_id"]},
-                {"$set": {"status": "vacant", "tenant_id": None, "updated_at": datetime.now()}}
-            )
+            await _set_property_occupancy(db, existing_tenant["property_id"], None)
+        
+        # Keep dashboard rollups in step with the cascade below
+        await record_transactions_removed(db, {"tenant_id": tenant_id})
+        await record_alerts_removed(db, {"tenant_id": tenant_id})
         
         # Delete related data
         await db.transactions.delete_many({"tenant_id": tenant_id})
@@ -201,6 +307,9 @@ async def delete_tenant(
         
         # Delete tenant
         await db.tenants.delete_one({"id": tenant_id})
+        invalidate_reference("tenants", tenant_id)
+        await record_tenant_change(db, existing_tenant, None)
+        invalidate_count_cache("tenants", "properties", "transactions", "alerts", "documents")
         
         logger.info("Tenant deleted", tenant_id=tenant_id, user=current_user.email)
         return {"message": "Tenant deleted successfully", "status": "success"}
@@ -1,13 +1,30 @@
 # Transactions API Router - SISMOBI Backend v3.2.0
 
-from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import List, Optional
+from fastapi import APIRouter, Body, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+import uuid
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 
 from database import get_database
-from models import Transaction, TransactionCreate, TransactionUpdate
-from utils import convert_objectid_to_str
+from config import settings
+from models import Transaction, TransactionCreate, TransactionUpdate, BulkCreateResponse
+from utils import (
+    convert_objectid_to_str, get_document_count, build_projection, invalidate_count_cache, create_transaction_filter,
+    validate_bulk_items, insert_many_unordered, build_bulk_response
+)
 from auth import get_current_user
+from exports import stream_csv, stream_ndjson
+from references import check_references, find_missing_references
+from responses import APIJSONResponse
+from rollups import record_transaction_change, record_transaction_changes
+
+TRANSACTION_EXPORT_COLUMNS = [
+    "id", "date", "type", "category", "description", "amount", "property_id", "tenant_id",
+    "recurring", "recurring_day", "notes", "created_at", "updated_at"
+]
 
 router = APIRouter(
     prefix="/transactions",
@@ -19,15 +36,19 @@ router = APIRouter(
 async def get_transactions(
     skip: int = Query(0, ge=0, description="Number of transactions to skip"),
     limit: int = Query(100, ge=1, le=100, description="Maximum number of transactions to return"),
+    include_total: bool = Query(True, description="Include the total count (disable for infinite scroll)"),
     property_id: Optional[str] = Query(None, description="Filter by property ID"),
     tenant_id: Optional[str] = Query(None, description="Filter by tenant ID"),
     type: Optional[str] = Query(None, description="Filter by transaction type (income/expense)"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included)"),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """
     Get all transactions with optional filtering and pagination
     """
     try:
+        projection = build_projection(fields)
+
         # Build filter query
         filter_query = {}
         if property_id:
@@ -38,30 +59,65 @@ async def get_transactions(
             filter_query["type"] = type
 
         # Get transactions with filters
-        cursor = db.transactions.find(filter_query).skip(skip).limit(limit).sort("date", -1)
+        cursor = db.transactions.find(filter_query, projection).skip(skip).limit(limit + 1).sort("date", -1)
         transactions = []
         
         async for transaction in cursor:
             clean_transaction = convert_objectid_to_str(transaction)
             transactions.append(clean_transaction)
 
-        # Get total count for pagination
-        total = await db.transactions.count_documents(filter_query)
+        # One extra document tells whether more exist without a count
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
 
-        return {
+        # Get total count for pagination (cached, and only when requested)
+        total = await get_document_count(db.transactions, filter_query) if include_total else None
+
+        return APIJSONResponse({
             "items": transactions,
             "total": total,
             "skip": skip,
             "limit": limit,
-            "has_more": skip + limit < total
-        }
+            "has_more": has_more
+        })
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching transactions: {str(e)}"
         )
 
+@router.get("/export")
+async def export_transactions(
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Export format (csv/ndjson)"),
+    property_id: Optional[str] = Query(None, description="Filter by property ID"),
+    tenant_id: Optional[str] = Query(None, description="Filter by tenant ID"),
+    type: Optional[str] = Query(None, description="Filter by transaction type (income/expense)"),
+    start_date: Optional[datetime] = Query(None, description="Only transactions on or after this date"),
+    end_date: Optional[datetime] = Query(None, description="Only transactions on or before this date"),
+    category: Optional[str] = Query(None, description="Filter by category (case-insensitive match)"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Stream every matching transaction, newest first, as CSV or NDJSON
+    """
+    filter_query = create_transaction_filter(property_id, tenant_id, type, start_date, end_date, category)
+    cursor = db.transactions.find(filter_query, {"_id": 0}).sort("date", -1).batch_size(1000)
+
+    filename = f"transactions-{datetime.now():%Y%m%d}.{format}"
+    if format == "csv":
+        body, media_type = stream_csv(cursor, TRANSACTION_EXPORT_COLUMNS), "text/csv"
+    else:
+        body, media_type = stream_ndjson(cursor), "application/x-ndjson"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.post("/", response_model=dict, status_code=201)
 async def create_transaction(
     transaction: TransactionCreate,
@@ -76,35 +132,29 @@ async def create_transaction(
         
         # Generate UUID for the transaction if not present
         if "id" not in transaction_dict:
-            import uuid
             transaction_dict["id"] = str(uuid.uuid4())
         
         # Set timestamps
-        from datetime import datetime
         transaction_dict["created_at"] = datetime.now()
         transaction_dict["updated_at"] = datetime.now()
         
-        # Verify property exists
-        if transaction_dict["property_id"]:
-            property_doc = await db.properties.find_one({"id": transaction_dict["property_id"]})
-            if not property_doc:
-                raise HTTPException(status_code=400, detail="Property not found")
-
-        # Verify tenant exists if provided
-        if transaction_dict.get("tenant_id"):
-            tenant_doc = await db.tenants.find_one({"id": transaction_dict["tenant_id"]})
-            if not tenant_doc:
-                raise HTTPException(status_code=400, detail="Tenant not found")
+        # Verify the referenced property and tenant exist
+        reference_error = await check_references(
+            db, transaction_dict["property_id"], transaction_dict.get("tenant_id")
+        )
+        if reference_error:
+            raise HTTPException(status_code=400, detail=reference_error)
 
         # Insert transaction
         result = await db.transactions.insert_one(transaction_dict)
+        invalidate_count_cache("transactions")
         
         if not result.inserted_id:
             raise HTTPException(status_code=500, detail="Failed to create transaction")
 
-        # Fetch and return the created transaction
-        created_transaction = await db.transactions.find_one({"_id": result.inserted_id})
-        return convert_objectid_to_str(created_transaction)
+        await record_transaction_change(db, None, transaction_dict)
+
+        return convert_objectid_to_str(transaction_dict)
 
     except HTTPException:
         raise
@@ -114,6 +164,58 @@ async def create_transaction(
             detail=f"Error creating transaction: {str(e)}"
         )
 
+@router.post("/bulk", response_model=BulkCreateResponse)
+async def create_transactions_bulk(
+    items: List[Dict[str, Any]] = Body(..., min_length=1, max_length=settings.bulk_max_items),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Create many transactions at once; each item is validated and reported separately
+    """
+    try:
+        valid, errors = validate_bulk_items(TransactionCreate, items)
+
+        # One $in query per referenced collection instead of one lookup per item
+        missing = await find_missing_references(db, {
+            "properties": [transaction.property_id for _, transaction in valid],
+            "tenants": [transaction.tenant_id for _, transaction in valid],
+        })
+
+        now = datetime.now()
+        positions: List[int] = []
+        documents: List[Dict[str, Any]] = []
+        for position, transaction in valid:
+            if transaction.property_id in missing["properties"]:
+                errors[position] = "Property not found"
+                continue
+            if transaction.tenant_id in missing["tenants"]:
+                errors[position] = "Tenant not found"
+                continue
+            positions.append(position)
+            documents.append({**transaction.dict(), "id": str(uuid.uuid4()), "created_at": now, "updated_at": now})
+
+        write_errors = await insert_many_unordered(db.transactions, documents)
+        created = {}
+        inserted: List[Dict[str, Any]] = []
+        for offset, document in enumerate(documents):
+            if offset in write_errors:
+                errors[positions[offset]] = write_errors[offset]
+            else:
+                created[positions[offset]] = document["id"]
+                inserted.append(document)
+
+        if inserted:
+            invalidate_count_cache("transactions")
+            await record_transaction_changes(db, [(None, document) for document in inserted])
+
+        return build_bulk_response(len(items), created, errors)
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error creating transactions: {str(e)}"
+        )
+
 @router.get("/{transaction_id}", response_model=dict)
 async def get_transaction(
     transaction_id: str,
@@ -148,40 +250,32 @@ async def update_transaction(
     Update a specific transaction
     """
     try:
-        # Check if transaction exists
-        existing_transaction = await db.transactions.find_one({"id": transaction_id})
-        if not existing_transaction:
-            raise HTTPException(status_code=404, detail="Transaction not found")
-
         # Prepare update data (exclude None values)
         update_data = {k: v for k, v in transaction_update.dict().items() if v is not None}
         
         if not update_data:
             raise HTTPException(status_code=400, detail="No data provided for update")
 
-        # Verify property exists if being updated
-        if "property_id" in update_data:
-            property_doc = await db.properties.find_one({"id": update_data["property_id"]})
-            if not property_doc:
-                raise HTTPException(status_code=400, detail="Property not found")
-
-        # Verify tenant exists if being updated
-        if "tenant_id" in update_data:
-            tenant_doc = await db.tenants.find_one({"id": update_data["tenant_id"]})
-            if not tenant_doc:
-                raise HTTPException(status_code=400, detail="Tenant not found")
+        # Verify the property and tenant exist if being updated
+        reference_error = await check_references(
+            db, update_data.get("property_id"), update_data.get("tenant_id")
+        )
+        if reference_error:
+            raise HTTPException(status_code=400, detail=reference_error)
 
-        # Update transaction
-        result = await db.transactions.update_one(
+        # Update transaction, keeping the previous version for the rollups
+        existing_transaction = await db.transactions.find_one_and_update(
             {"id": transaction_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
         )
-
-        if result.matched_count == 0:
+        if not existing_transaction:
             raise HTTPException(status_code=404, detail="Transaction not found")
 
-        # Fetch and return updated transaction
-        updated_transaction = await db.transactions.find_one({"id": transaction_id})
+        invalidate_count_cache("transactions")
+        updated_transaction = {**existing_transaction, **update_data}
+        await record_transaction_change(db, existing_transaction, updated_transaction)
+
         return convert_objectid_to_str(updated_transaction)
 
     except HTTPException:
@@ -201,11 +295,14 @@ async def delete_transaction(
     Delete a specific transaction
     """
     try:
-        result = await db.transactions.delete_one({"id": transaction_id})
+        deleted_transaction = await db.transactions.find_one_and_delete({"id": transaction_id})
+        invalidate_count_cache("transactions")
         
-        if result.deleted_count == 0:
+        if not deleted_transaction:
             raise HTTPException(status_code=404, detail="Transaction not found")
 
+        await record_transaction_change(db, deleted_transaction, None)
+
         return
 
     except HTTPException:
@@ -0,0 +1,245 @@
+# Water Bills API Router - SISMOBI Backend v3.2.0
+
+from fastapi import APIRouter, HTTPException, Depends, File, Query, UploadFile
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+import uuid
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from config import settings
+from database import get_database
+from models import WaterBillingRun
+from utils import convert_objectid_to_str, get_document_count, invalidate_count_cache, build_projection
+from auth import get_current_user
+from references import find_missing_references
+from responses import APIJSONResponse
+from ingestion import detect_format, import_bills
+from allocations import allocate_water_bills, validate_people_counts
+
+router = APIRouter(
+    prefix="/water-bills",
+    tags=["water-bills"],
+    dependencies=[Depends(get_current_user)]  # Require authentication
+)
+
+@router.get("/", response_model=dict)
+async def get_water_bills(
+    skip: int = Query(0, ge=0, description="Number of bills to skip"),
+    limit: int = Query(100, ge=1, le=100, description="Maximum number of bills to return"),
+    include_total: bool = Query(True, description="Include the total count (disable for infinite scroll)"),
+    property_id: Optional[str] = Query(None, description="Filter by property ID"),
+    group_id: Optional[str] = Query(None, description="Filter by water group ID"),
+    year: Optional[int] = Query(None, ge=2000, le=3000, description="Filter by billing year"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Filter by billing month"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (id is always included)"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Get water bills with optional filtering and pagination, newest period first
+    """
+    try:
+        projection = build_projection(fields)
+
+        # Build filter query
+        filter_query = {}
+        if property_id:
+            filter_query["property_id"] = property_id
+        if group_id:
+            filter_query["group_id"] = group_id
+        if year:
+            filter_query["year"] = year
+        if month:
+            filter_query["month"] = month
+
+        cursor = db.water_bills.find(filter_query, projection).sort(
+            [("year", -1), ("month", -1), ("id", 1)]
+        ).skip(skip).limit(limit + 1)
+        bills = [convert_objectid_to_str(bill) async for bill in cursor]
+
+        # One extra document tells whether more exist without a count
+        has_more = len(bills) > limit
+        bills = bills[:limit]
+
+        total = await get_document_count(db.water_bills, filter_query) if include_total else None
+
+        return APIJSONResponse({
+            "items": bills,
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "has_more": has_more
+        })
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching water bills: {str(e)}"
+        )
+
+@router.post("/import", response_model=dict)
+async def import_water_bills(
+    file: UploadFile = File(..., description="CSV or XLSX file with one bill per row"),
+    format: Optional[str] = Query(None, pattern="^(csv|xlsx)$", description="File format (default: from the file name)"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Import water bills from a spreadsheet, upserting one bill per
+    (property, group, year, month) and reporting invalid rows
+    """
+    try:
+        file_format = detect_format(file.filename, format)
+        return await import_bills(db, "water", file.file, file_format, settings.import_chunk_size)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error importing water bills: {str(e)}"
+        )
+
+@router.post("/billing-run", response_model=dict)
+async def run_water_billing(
+    run: WaterBillingRun,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Allocate a month's water bills for every group in one pass
+
+    Groups with missing people counts or an unknown property, and repeats
+    of a property and group already listed in the run, are reported and
+    skipped. With ``persist`` the bills are upserted per
+    (property, group, year, month), so re-running a month updates them.
+    """
+    try:
+        if len(run.groups) > settings.bulk_max_items:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {settings.bulk_max_items} groups can be billed at once"
+            )
+
+        missing = await find_missing_references(db, {"properties": [group.property_id for group in run.groups]})
+        errors: Dict[int, str] = {}
+        seen: Dict[tuple, int] = {}
+        for position, group in enumerate(run.groups):
+            key = (group.property_id, group.group_id)
+            if key in seen:
+                errors[position] = f"Group already listed at index {seen[key]}"
+                continue
+            seen[key] = position
+            if group.property_id in missing["properties"]:
+                errors[position] = "Property not found"
+            else:
+                people_error = validate_people_counts(group.people_counts)
+                if people_error:
+                    errors[position] = people_error
+
+        valid = [(position, group.dict()) for position, group in enumerate(run.groups) if position not in errors]
+        allocations = allocate_water_bills([group for _, group in valid])
+
+        results: List[Dict[str, Any]] = [
+            {"index": position, "group_id": group.group_id, "property_id": group.property_id,
+             "status": "failed", "error": errors[position]}
+            for position, group in enumerate(run.groups) if position in errors
+        ]
+        for (position, group), allocation in zip(valid, allocations):
+            results.append({"index": position, "group_id": group["group_id"], "property_id": group["property_id"],
+                            "status": "allocated", "tenant_allocations": allocation})
+        results.sort(key=lambda result: result["index"])
+
+        inserted = updated = 0
+        if run.persist and valid:
+            now = datetime.now()
+            operations = [
+                UpdateOne(
+                    {"property_id": group["property_id"], "group_id": group["group_id"],
+                     "year": run.year, "month": run.month},
+                    {
+                        "$set": {
+                            "total_amount": group["total_amount"],
+                            "total_liters": group["total_liters"],
+                            "people_counts": group["people_counts"],
+                            "tenant_allocations": allocation,
+                            "reading_date": run.reading_date,
+                            "due_date": run.due_date,
+                            "updated_at": now,
+                        },
+                        "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now},
+                    },
+                    upsert=True
+                )
+                for (_, group), allocation in zip(valid, allocations)
+            ]
+            result = await db.water_bills.bulk_write(operations, ordered=False)
+            inserted, updated = result.upserted_count, result.matched_count
+            if inserted:
+                invalidate_count_cache("water_bills")
+
+        return {
+            "allocated": len(valid),
+            "failed": len(errors),
+            "persisted": run.persist,
+            "inserted": inserted,
+            "updated": updated,
+            "groups": results
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error running water billing: {str(e)}"
+        )
+
+@router.get("/{bill_id}", response_model=dict)
+async def get_water_bill(
+    bill_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Get a specific water bill by ID
+    """
+    try:
+        bill = await db.water_bills.find_one({"id": bill_id})
+
+        if not bill:
+            raise HTTPException(status_code=404, detail="Water bill not found")
+
+        return convert_objectid_to_str(bill)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching water bill: {str(e)}"
+        )
+
+@router.delete("/{bill_id}", status_code=204)
+async def delete_water_bill(
+    bill_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Delete a specific water bill
+    """
+    try:
+        result = await db.water_bills.delete_one({"id": bill_id})
+
+        if result.deleted_count == 0:
+            raise HTTPException(status_code=404, detail="Water bill not found")
+
+        invalidate_count_cache("water_bills")
+        return
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error deleting water bill: {str(e)}"
+        )
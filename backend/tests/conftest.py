@@ -0,0 +1,25 @@
+"""
+Shared fixtures for the backend test suite
+
+The backend modules import each other as top-level modules (``from config
+import settings``), so the backend directory goes on ``sys.path``. Database
+tests run against an in-memory mongomock database.
+"""
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+@pytest.fixture
+def db():
+    from mongomock_motor import AsyncMongoMockClient
+    from references import invalidate_reference
+    from utils import invalidate_count_cache
+
+    for collection_name in ("properties", "tenants"):
+        invalidate_reference(collection_name)
+    database = AsyncMongoMockClient()["sismobi_test"]
+    yield database
+    invalidate_count_cache("energy_bills", "water_bills")
@@ -0,0 +1,101 @@
+"""Tests for the energy and water allocation engines"""
+import pytest
+
+from allocations import allocate_energy_bills, allocate_water_bills, validate_people_counts
+
+def _cents(allocation):
+    return sum(round(value * 100) for value in allocation.values())
+
+def _energy(total_amount, total_kwh, meters, receiver=None):
+    return {"total_amount": total_amount, "total_kwh": total_kwh,
+            "meter_consumptions": meters, "residual_receiver": receiver}
+
+def test_energy_allocations_sum_to_bill_total():
+    bills = [
+        _energy(100.0, 300, {"a": 100, "b": 100}, "common"),
+        _energy(87.13, 211.7, {"a": 13.3, "b": 77.7, "c": 41.9}, "b"),
+        _energy(0.01, 3, {"a": 1}, "r"),
+    ]
+
+    allocations = allocate_energy_bills(bills)
+
+    for bill, allocation in zip(bills, allocations):
+        assert _cents(allocation) == round(bill["total_amount"] * 100)
+
+def test_energy_residual_receiver_absorbs_rounding():
+    [allocation] = allocate_energy_bills([_energy(100.0, 300, {"a": 100, "b": 100}, "common")])
+
+    assert allocation == {"a": 33.33, "b": 33.33, "common": 33.34}
+
+def test_energy_receiver_with_a_meter_pays_for_both():
+    [allocation] = allocate_energy_bills([_energy(90.0, 90, {"a": 30, "b": 20}, "a")])
+
+    assert allocation == {"a": 70.0, "b": 20.0}
+
+def test_energy_zero_reading_pays_nothing():
+    [allocation] = allocate_energy_bills([_energy(50.0, 100, {"a": 0, "b": 60}, "r")])
+
+    assert allocation == {"a": 0.0, "b": 30.0, "r": 20.0}
+
+def test_energy_all_zero_readings_leave_the_bill_to_the_receiver():
+    [allocation] = allocate_energy_bills([_energy(50.0, 100, {"a": 0, "b": 0}, "r")])
+
+    assert allocation == {"a": 0.0, "b": 0.0, "r": 50.0}
+
+@pytest.mark.parametrize("total_amount, total_kwh", [(50.0, 0), (0, 100), (None, None)])
+def test_energy_bill_without_consumption_or_value_allocates_nothing(total_amount, total_kwh):
+    [allocation] = allocate_energy_bills([_energy(total_amount, total_kwh, {"a": 10}, "r")])
+
+    assert allocation == {"a": 0.0, "r": 0.0}
+
+def test_energy_bills_are_independent_within_a_batch():
+    bills = [_energy(100.0, 300, {"a": 100, "b": 100}, "common"), _energy(10.0, 10, {"a": 4}, "r")]
+
+    assert allocate_energy_bills(bills) == [allocate_energy_bills([bill])[0] for bill in bills]
+
+def test_energy_empty_batch():
+    assert allocate_energy_bills([]) == []
+
+def test_water_allocations_sum_to_bill_total():
+    bills = [
+        {"total_amount": 100.0, "people_counts": {"a": 1, "b": 1, "c": 1}},
+        {"total_amount": 123.45, "people_counts": {"a": 3, "b": 2, "c": 2, "d": 7}},
+        {"total_amount": 0.05, "people_counts": {"a": 1, "b": 1, "c": 1, "d": 1, "e": 1, "f": 1}},
+    ]
+
+    allocations = allocate_water_bills(bills)
+
+    for bill, allocation in zip(bills, allocations):
+        assert _cents(allocation) == round(bill["total_amount"] * 100)
+
+def test_water_leftover_cent_goes_to_the_earliest_entry_on_ties():
+    [allocation] = allocate_water_bills([{"total_amount": 100.0, "people_counts": {"b": 1, "a": 1, "c": 1}}])
+
+    assert allocation == {"b": 33.34, "a": 33.33, "c": 33.33}
+
+def test_water_leftover_cents_go_to_the_largest_remainders():
+    # 1000 cents over 7 people: 2000/7 = 285 r5, 3000/7 = 428 r4, 2000/7 = 285 r5;
+    # the two leftover cents go to the remainders of 5
+    [allocation] = allocate_water_bills([{"total_amount": 10.0, "people_counts": {"a": 2, "b": 3, "c": 2}}])
+
+    assert allocation == {"a": 2.86, "b": 4.28, "c": 2.86}
+
+def test_water_allocation_is_deterministic():
+    bill = {"total_amount": 123.45, "people_counts": {"a": 3, "b": 2, "c": 2, "d": 7}}
+
+    assert allocate_water_bills([bill]) == allocate_water_bills([dict(bill)])
+
+def test_water_zero_people_counts():
+    assert validate_people_counts({"a": 2, "b": 0}) == "Number of people missing for: b"
+
+    [allocation] = allocate_water_bills([{"total_amount": 80.0, "people_counts": {"a": 0, "b": 0}}])
+
+    assert allocation == {"a": 0.0, "b": 0.0}
+
+def test_water_bill_without_value_allocates_nothing():
+    [allocation] = allocate_water_bills([{"total_amount": 0, "people_counts": {"a": 2, "b": 1}}])
+
+    assert allocation == {"a": 0.0, "b": 0.0}
+
+def test_water_empty_batch():
+    assert allocate_water_bills([]) == []
@@ -0,0 +1,115 @@
+"""Tests for spreadsheet ingestion of utility bills"""
+import asyncio
+import io
+
+import pytest
+from openpyxl import Workbook
+
+import ingestion
+from ingestion import import_bills
+
+WATER_HEADER = "property_id,group_id,month,year,total_amount,total_liters,reading_date,due_date,people_counts"
+
+def _water_row(group_id="g1", month=3, amount="90", people="apt101=2; apt102=1", property_id="p1"):
+    return f"{property_id},{group_id},{month},2026,{amount},12000,2026-03-28,2026-04-10,{people}"
+
+def _csv(*rows, header=WATER_HEADER):
+    return io.BytesIO("\n".join((header,) + rows).encode())
+
+def _import(db, file, chunk_size=500, kind="water", file_format="csv"):
+    return asyncio.run(import_bills(db, kind, file, file_format, chunk_size))
+
+def _bills(db):
+    return asyncio.run(db.water_bills.find({}, {"_id": 0}).sort([("group_id", 1), ("month", 1)]).to_list(None))
+
+@pytest.fixture
+def property_db(db):
+    asyncio.run(db.properties.insert_one({"id": "p1"}))
+    return db
+
+def test_valid_rows_are_allocated_and_upserted(property_db):
+    summary = _import(property_db, _csv(_water_row(), _water_row("g2", amount="10")))
+
+    assert summary == {"rows": 2, "inserted": 2, "updated": 0, "failed": 0, "errors": [],
+                       "errors_truncated": False}
+    bills = _bills(property_db)
+    assert bills[0]["tenant_allocations"] == {"apt101": 60.0, "apt102": 30.0}
+    assert bills[1]["tenant_allocations"] == {"apt101": 6.67, "apt102": 3.33}
+
+def test_invalid_rows_are_reported_with_their_row_number(property_db):
+    summary = _import(property_db, _csv(
+        _water_row("g1"),
+        _water_row("g2", month=13),
+        _water_row("g3", people="apt101"),
+        _water_row("g4", people="apt101=2; apt102=0"),
+        _water_row("g5", property_id="missing"),
+        _water_row("g6", amount="abc"),
+    ))
+
+    assert (summary["rows"], summary["inserted"], summary["failed"]) == (6, 1, 5)
+    errors = {error["row"]: error["error"] for error in summary["errors"]}
+    assert sorted(errors) == [3, 4, 5, 6, 7]
+    assert errors[3].startswith("month:")
+    assert errors[4] == "people_counts: expected recipient=value pairs separated by ';'"
+    assert errors[5] == "Number of people missing for: apt102"
+    assert errors[6] == "Property not found"
+    assert errors[7].startswith("total_amount:")
+    assert [bill["group_id"] for bill in _bills(property_db)] == ["g1"]
+
+def test_later_duplicate_within_a_chunk_wins(property_db):
+    summary = _import(property_db, _csv(_water_row(amount="90"), _water_row("g2"), _water_row(amount="120")))
+
+    assert (summary["inserted"], summary["updated"], summary["failed"]) == (2, 0, 0)
+    bill = asyncio.run(property_db.water_bills.find_one({"group_id": "g1"}))
+    assert bill["total_amount"] == 120.0
+
+def test_duplicate_across_chunks_updates_the_first(property_db):
+    summary = _import(property_db, _csv(_water_row(amount="90"), _water_row("g2"), _water_row(amount="120")),
+                      chunk_size=2)
+
+    assert (summary["rows"], summary["inserted"], summary["updated"]) == (3, 2, 1)
+    bill = asyncio.run(property_db.water_bills.find_one({"group_id": "g1"}))
+    assert bill["total_amount"] == 120.0
+    assert asyncio.run(property_db.water_bills.count_documents({})) == 2
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 500])
+def test_row_numbers_are_kept_across_chunk_boundaries(property_db, chunk_size):
+    summary = _import(property_db, _csv(
+        _water_row("g1"),
+        ",,,,,,,,",
+        _water_row("g2", month=0),
+        _water_row("g3"),
+        _water_row("g4", people="apt101=x"),
+    ), chunk_size=chunk_size)
+
+    assert (summary["rows"], summary["inserted"], summary["failed"]) == (5, 2, 2)
+    assert [error["row"] for error in summary["errors"]] == [4, 6]
+
+def test_reported_errors_are_capped(property_db, monkeypatch):
+    monkeypatch.setattr(ingestion, "MAX_REPORTED_ERRORS", 3)
+
+    summary = _import(property_db, _csv(*(_water_row(f"g{i}", month=13) for i in range(5))), chunk_size=2)
+
+    assert summary["failed"] == 5
+    assert [error["row"] for error in summary["errors"]] == [2, 3, 4]
+    assert summary["errors_truncated"] is True
+
+def test_missing_required_columns_are_rejected(property_db):
+    with pytest.raises(ValueError, match="Missing required columns: total_liters"):
+        _import(property_db, _csv(_water_row(), header=WATER_HEADER.replace(",total_liters", ",liters")))
+
+def test_xlsx_numeric_ids_are_read_as_strings(db):
+    asyncio.run(db.properties.insert_one({"id": "101"}))
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(WATER_HEADER.split(","))
+    sheet.append([101, 7, 3, 2026, 90, 12000, "2026-03-28", "2026-04-10", "apt101=2; apt102=1"])
+    file = io.BytesIO()
+    workbook.save(file)
+    file.seek(0)
+
+    summary = _import(db, file, file_format="xlsx")
+
+    assert (summary["inserted"], summary["failed"]) == (1, 0)
+    bill = asyncio.run(db.water_bills.find_one({}))
+    assert (bill["property_id"], bill["group_id"]) == ("101", "7")
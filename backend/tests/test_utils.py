@@ -0,0 +1,38 @@
+"""Tests for keyset pagination cursors"""
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from utils import create_keyset_filter, decode_cursor, encode_cursor
+
+def _raw_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+@pytest.mark.parametrize("value", ["Alice", 42, 1.5, True, None, datetime(2026, 3, 1, 12, 30)])
+def test_cursor_round_trip(value):
+    assert decode_cursor(encode_cursor(value, "abc")) == (value, "abc")
+
+@pytest.mark.parametrize("value", [
+    {"$ne": None},
+    {"$gt": ""},
+    {"$dt": "2026-03-01", "$ne": None},
+    {"$dt": 5},
+    ["a", "b"],
+])
+def test_non_scalar_cursor_value_is_rejected(value):
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        create_keyset_filter({}, _raw_cursor({"v": value, "id": "abc"}), "created_at", -1)
+
+def test_non_string_cursor_id_is_rejected():
+    with pytest.raises(ValueError, match="Invalid pagination cursor"):
+        decode_cursor(_raw_cursor({"v": 1, "id": {"$ne": None}}))
+
+def test_keyset_filter_uses_cursor_value():
+    cursor = encode_cursor("b", "id2")
+
+    assert create_keyset_filter({"status": "active"}, cursor, "name", 1) == {"$and": [
+        {"status": "active"},
+        {"$or": [{"name": {"$gt": "b"}}, {"name": "b", "id": {"$gt": "id2"}}]},
+    ]}
@@ -0,0 +1,44 @@
+"""Tests for the monthly water billing run"""
+import asyncio
+from datetime import datetime
+
+from models import WaterBillingRun
+from routers.water_bills import run_water_billing
+
+def _run(*groups, persist=True):
+    return WaterBillingRun(
+        month=3, year=2026, reading_date=datetime(2026, 3, 28), due_date=datetime(2026, 4, 10),
+        groups=list(groups), persist=persist
+    )
+
+def _group(group_id="g1", property_id="p1", amount=90.0):
+    return {"property_id": property_id, "group_id": group_id, "total_amount": amount,
+            "total_liters": 12000, "people_counts": {"t1": 2, "t2": 1}}
+
+def test_repeated_group_is_reported_and_not_written(db):
+    asyncio.run(db.properties.insert_one({"id": "p1"}))
+
+    result = asyncio.run(run_water_billing(_run(_group(), _group("g2"), _group(amount=120.0)), db=db))
+
+    assert result["allocated"] == 2
+    assert result["failed"] == 1
+    assert result["inserted"] == 2
+    assert [group["status"] for group in result["groups"]] == ["allocated", "allocated", "failed"]
+    assert result["groups"][2]["error"] == "Group already listed at index 0"
+    bill = asyncio.run(db.water_bills.find_one({"group_id": "g1"}))
+    assert bill["total_amount"] == 90.0
+    assert asyncio.run(db.water_bills.count_documents({})) == 2
+
+def test_same_group_of_another_property_is_not_a_repeat(db):
+    asyncio.run(db.properties.insert_many([{"id": "p1"}, {"id": "p2"}]))
+
+    result = asyncio.run(run_water_billing(_run(_group(), _group(property_id="p2")), db=db))
+
+    assert result["failed"] == 0
+    assert result["inserted"] == 2
+
+def test_unknown_property_is_reported(db):
+    result = asyncio.run(run_water_billing(_run(_group(property_id="missing"), persist=False), db=db))
+
+    assert result["groups"] == [{"index": 0, "group_id": "g1", "property_id": "missing",
+                                 "status": "failed", "error": "Property not found"}]
@@ -3,12 +3,34 @@ Utility functions for SISMOBI 3.2.0
 """
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
+import asyncio
+import base64
+import json
+import re
 import structlog
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from cache import TTLCache
+from config import settings
 
 logger = structlog.get_logger(__name__)
 
+# Total counts keyed by (collection name, normalized filter)
+_count_cache = TTLCache(
+    max_size=settings.count_cache_max_size,
+    ttl_seconds=settings.count_cache_ttl_seconds
+)
+
+# Lower score sorts first; stored on alerts so MongoDB can sort by it
+ALERT_PRIORITY_SCORES = {"critical": 1, "high": 2, "medium": 3, "low": 4}
+
+def get_priority_score(priority: Optional[str]) -> int:
+    """Sortable score for an alert priority (unknown values rank as medium)"""
+    return ALERT_PRIORITY_SCORES.get(priority, ALERT_PRIORITY_SCORES["medium"])
+
 def convert_objectid_to_str(document: Dict[str, Any]) -> Dict[str, Any]:
     """Convert MongoDB ObjectId to string for JSON serialization"""
     if document is None:
@@ -28,125 +50,355 @@ def serialize_datetime(obj):
         return obj.isoformat()
     raise TypeError("Type not serializable")
 
+def normalize_filter(filter_dict: Optional[Dict[str, Any]]) -> str:
+    """Stable string form of a query filter, usable as a cache key"""
+    return json.dumps(filter_dict or {}, sort_keys=True, default=str)
+
+async def get_document_count(collection, filter_dict: Dict[str, Any] = None) -> int:
+    """Count documents matching a filter, served from a short-TTL cache
+
+    Unfiltered counts use ``estimated_document_count`` (collection metadata)
+    instead of scanning the collection.
+    """
+    cache_key = (collection.name, normalize_filter(filter_dict))
+    cached_count = _count_cache.get(cache_key)
+    if cached_count is not None:
+        return cached_count
+    
+    if filter_dict:
+        count = await collection.count_documents(filter_dict)
+    else:
+        count = await collection.estimated_document_count()
+    
+    _count_cache.set(cache_key, count)
+    return count
+
+def invalidate_count_cache(*collection_names: str) -> None:
+    """Drop cached counts for collections that were just written to"""
+    names = set(collection_names)
+    _count_cache.invalidate_where(lambda key: key[0] in names)
+
+def encode_cursor(sort_value: Any, document_id: str) -> str:
+    """Build an opaque keyset cursor from the last item's sort value and id"""
+    if isinstance(sort_value, datetime):
+        value = {"$dt": sort_value.isoformat()}
+    else:
+        value = sort_value
+    payload = json.dumps({"v": value, "id": document_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+CURSOR_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a keyset cursor into (sort_value, id); raises ValueError if malformed
+
+    Cursors come from clients, so the sort value must be a scalar or the
+    ``$dt`` wrapper; anything else (e.g. ``{"$ne": null}``) would be
+    interpreted by Mongo as a query operator.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, document_id = payload["v"], payload["id"]
+        if isinstance(value, dict) and list(value) == ["$dt"] and isinstance(value["$dt"], str):
+            value = datetime.fromisoformat(value["$dt"])
+        elif not isinstance(value, CURSOR_SCALAR_TYPES):
+            raise ValueError("Cursor value must be a scalar")
+        if not isinstance(document_id, str):
+            raise ValueError("Cursor id must be a string")
+        return value, document_id
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+def create_keyset_filter(
+    filter_dict: Dict[str, Any],
+    cursor: str,
+    sort_field: str,
+    sort_direction: int
+) -> Dict[str, Any]:
+    """Restrict a filter to documents strictly after the cursor position"""
+    sort_value, document_id = decode_cursor(cursor)
+    operator = "$lt" if sort_direction < 0 else "$gt"
+    keyset_condition = {
+        "$or": [
+            {sort_field: {operator: sort_value}},
+            {sort_field: sort_value, "id": {operator: document_id}}
+        ]
+    }
+    if not filter_dict:
+        return keyset_condition
+    return {"$and": [filter_dict, keyset_condition]}
+
+FIELD_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+MAX_PROJECTED_FIELDS = 50
+
+def build_projection(fields: Optional[str], required: tuple = ("id",)) -> Optional[Dict[str, int]]:
+    """Mongo projection for a ``?fields=a,b,c`` parameter, or None for whole documents
+
+    ``required`` fields (the id, plus anything pagination relies on) are
+    always included. Raises ValueError for malformed field names.
+    """
+    if not fields or not fields.strip():
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    if len(names) > MAX_PROJECTED_FIELDS:
+        raise ValueError(f"At most {MAX_PROJECTED_FIELDS} fields can be requested")
+    invalid = [name for name in names if not FIELD_NAME_PATTERN.match(name)]
+    if invalid:
+        raise ValueError(f"Invalid field names: {', '.join(invalid)}")
+    projection = {name: 1 for name in names}
+    projection.update({name: 1 for name in required})
+    projection["_id"] = 0
+    return projection
+
 async def get_paginated_results(
     collection,
     filter_dict: Dict[str, Any] = None,
     page: int = 1,
     page_size: int = 50,
     sort_field: str = "created_at",
-    sort_direction: int = -1
+    sort_direction: int = -1,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
+    fields: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Get paginated results from MongoDB collection"""
+    """Get paginated results from MongoDB collection
+
+    When ``cursor`` is given, keyset pagination on ``(sort_field, id)`` is used
+    instead of ``skip``, so every page costs the same regardless of depth.
+    Every response carries ``next_cursor`` so clients can switch to cursor mode
+    after the first page.
+
+    ``include_total`` defaults to True in offset mode and False in cursor mode;
+    when totals are requested they come from the cached ``get_document_count``.
+
+    ``fields`` is a comma-separated list of fields to return; ``id`` and
+    ``sort_field`` are always included so the next cursor can be built.
+    """
     if filter_dict is None:
         filter_dict = {}
+    if include_total is None:
+        include_total = cursor is None
+    projection = build_projection(fields, ("id", sort_field))
     
-    # Calculate skip value
-    skip = (page - 1) * page_size
+    sort_spec = [(sort_field, sort_direction), ("id", sort_direction)]
     
-    # Get total count
-    total_count = await collection.count_documents(filter_dict)
+    if cursor:
+        query = create_keyset_filter(filter_dict, cursor, sort_field, sort_direction)
+        mongo_cursor = collection.find(query, projection).sort(sort_spec).limit(page_size + 1)
+    else:
+        # Calculate skip value
+        skip = (page - 1) * page_size
+        
+        # Get paginated results
+        mongo_cursor = collection.find(filter_dict, projection).sort(sort_spec).skip(skip).limit(page_size + 1)
     
-    # Get paginated results
-    cursor = collection.find(filter_dict).sort(sort_field, sort_direction).skip(skip).limit(page_size)
     items = []
-    
-    async for document in cursor:
+    async for document in mongo_cursor:
         items.append(convert_objectid_to_str(document))
     
+    # The extra document only tells us whether another page exists
+    has_next = len(items) > page_size
+    items = items[:page_size]
+    
+    next_cursor = None
+    if has_next and items:
+        last_item = items[-1]
+        next_cursor = encode_cursor(last_item.get(sort_field), last_item["id"])
+    
     # Calculate pagination info
-    total_pages = (total_count + page_size - 1) // page_size
-    has_next = page < total_pages
-    has_prev = page > 1
+    total_count = None
+    total_pages = None
+    if include_total:
+        total_count = await get_document_count(collection, filter_dict)
+        total_pages = (total_count + page_size - 1) // page_size
+    has_prev = True if cursor else page > 1
     
     return {
         "items": items,
         "pagination": {
-            "current_page": page,
+            "current_page": None if cursor else page,
             "page_size": page_size,
             "total_count": total_count,
             "total_pages": total_pages,
             "has_next": has_next,
-            "has_prev": has_prev
+            "has_prev": has_prev,
+            "next_cursor": next_cursor
         }
     }
 
-async def validate_property_exists(db: AsyncIOMotorDatabase, property_id: str) -> bool:
-    """Validate if property exists"""
-    try:
-        property_doc = await db.properties.find_one({"id": property_id})
-        return property_doc is not None
-    except Exception as e:
-        logger.error("Error validating property", property_id=property_id, error=str(e))
-        return False
+def get_month_range(reference: Optional[datetime] = None) -> tuple:
+    """Return (first day of month, first day of next month) for a date"""
+    reference = reference or datetime.now()
+    month_start = reference.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    return month_start, next_month
+
+def build_dashboard_counts_pipeline() -> List[Dict[str, Any]]:
+    """Pipeline over properties that also counts active tenants and open alerts
 
-async def validate_tenant_exists(db: AsyncIOMotorDatabase, tenant_id: str) -> bool:
-    """Validate if tenant exists"""
+    The tenant and alert branches are pulled in with ``$unionWith`` (MongoDB
+    4.4+) so every count comes back from a single round trip.
+    """
+    return [
+        {"$project": {"_id": 0, "source": {"$literal": "properties"}, "status": 1}},
+        {
+            "$unionWith": {
+                "coll": "tenants",
+                "pipeline": [
+                    {"$match": {"status": "active"}},
+                    {"$project": {"_id": 0, "source": {"$literal": "tenants"}}}
+                ]
+            }
+        },
+        {
+            "$unionWith": {
+                "coll": "alerts",
+                "pipeline": [
+                    {"$match": {"resolved": False}},
+                    {"$project": {"_id": 0, "source": {"$literal": "alerts"}}}
+                ]
+            }
+        },
+        {
+            "$group": {
+                "_id": {"source": "$source", "status": "$status"},
+                "count": {"$sum": 1}
+            }
+        }
+    ]
+
+def build_dashboard_transactions_pipeline(month_start: datetime, next_month: datetime) -> List[Dict[str, Any]]:
+    """Monthly income/expense totals and the five latest transactions in one pipeline
+
+    The month ``$match`` runs first so it can use an index; the latest
+    transactions come from a ``$unionWith`` branch (index-backed sort on
+    ``created_at``) and ``$facet`` splits the two result sets.
+    """
+    return [
+        {
+            "$match": {
+                "type": {"$in": ["income", "expense"]},
+                "date": {"$gte": month_start, "$lt": next_month}
+            }
+        },
+        {"$group": {"_id": "$type", "total": {"$sum": "$amount"}}},
+        {"$project": {"_id": 0, "section": {"$literal": "totals"}, "type": "$_id", "total": 1}},
+        {
+            "$unionWith": {
+                "coll": "transactions",
+                "pipeline": [
+                    {"$sort": {"created_at": -1}},
+                    {"$limit": 5},
+                    {"$project": {"_id": 0, "section": {"$literal": "recent"}, "document": "$$ROOT"}}
+                ]
+            }
+        },
+        {
+            "$facet": {
+                "totals": [{"$match": {"section": "totals"}}],
+                "recent": [{"$match": {"section": "recent"}}]
+            }
+        }
+    ]
+
+def format_validation_errors(errors: List[Dict[str, Any]]) -> str:
+    """One readable line for a list of Pydantic error dicts"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in errors
+    )
+
+def validate_bulk_items(model: type, items: List[Dict[str, Any]]) -> tuple:
+    """Validate raw bulk items one by one
+
+    Returns ``(valid, errors)`` where ``valid`` is a list of (position, model)
+    and ``errors`` maps positions to a readable message, so one bad item does
+    not reject the whole batch.
+    """
+    valid: List[tuple] = []
+    errors: Dict[int, str] = {}
+    for position, item in enumerate(items):
+        try:
+            valid.append((position, model(**item)))
+        except ValidationError as e:
+            errors[position] = format_validation_errors(e.errors())
+    return valid, errors
+
+async def insert_many_unordered(collection, documents: List[Dict[str, Any]]) -> Dict[int, str]:
+    """Insert documents without stopping at the first failure
+
+    Returns the write errors keyed by position in ``documents``.
+    """
+    if not documents:
+        return {}
     try:
-        tenant_doc = await db.tenants.find_one({"id": tenant_id})
-        return tenant_doc is not None
-    except Exception as e:
-        logger.error("Error validating tenant", tenant_id=tenant_id, error=str(e))
-        return False
+        await collection.insert_many(documents, ordered=False)
+        return {}
+    except BulkWriteError as e:
+        return {
+            error["index"]: error.get("errmsg", "Write failed")
+            for error in e.details.get("writeErrors", [])
+        }
+
+def build_bulk_response(total: int, created: Dict[int, str], errors: Dict[int, str]) -> Dict[str, Any]:
+    """Per-item bulk result; ``created`` maps positions to new document ids"""
+    results = []
+    for position in range(total):
+        if position in created:
+            results.append({"index": position, "status": "created", "id": created[position]})
+        else:
+            results.append({
+                "index": position,
+                "status": "failed",
+                "error": errors.get(position, "Not processed")
+            })
+    return {"created": len(created), "failed": total - len(created), "results": results}
 
 async def calculate_dashboard_summary(db: AsyncIOMotorDatabase) -> Dict[str, Any]:
-    """Calculate dashboard summary statistics"""
+    """Calculate dashboard summary statistics
+
+    Runs two aggregations concurrently: one for property/tenant/alert counts
+    and one for the current month's totals plus the five latest transactions.
+    """
     try:
-        # Get counts
-        total_properties = await db.properties.count_documents({})
-        total_tenants = await db.tenants.count_documents({"status": "active"})
-        occupied_properties = await db.properties.count_documents({"status": "rented"})
-        vacant_properties = await db.properties.count_documents({"status": "vacant"})
-        
-        # Calculate monthly income/expenses
-        current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        next_month = current_month + timedelta(days=32)
-        next_month = next_month.replace(day=1)
-        
-        # Get transactions for current month
-        monthly_income_pipeline = [
-            {
-                "$match": {
-                    "type": "income",
-                    "date": {"$gte": current_month, "$lt": next_month}
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "total": {"$sum": "$amount"}
-                }
-            }
-        ]
-        
-        monthly_expense_pipeline = [
-            {
-                "$match": {
-                    "type": "expense",
-                    "date": {"$gte": current_month, "$lt": next_month}
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "total": {"$sum": "$amount"}
-                }
-            }
-        ]
+        month_start, next_month = get_month_range()
         
-        income_result = await db.transactions.aggregate(monthly_income_pipeline).to_list(1)
-        expense_result = await db.transactions.aggregate(monthly_expense_pipeline).to_list(1)
+        counts_result, transactions_result = await asyncio.gather(
+            db.properties.aggregate(build_dashboard_counts_pipeline()).to_list(None),
+            db.transactions.aggregate(
+                build_dashboard_transactions_pipeline(month_start, next_month)
+            ).to_list(1)
+        )
         
-        total_monthly_income = income_result[0]["total"] if income_result else 0
-        total_monthly_expenses = expense_result[0]["total"] if expense_result else 0
+        # Fold grouped counts
+        total_properties = 0
+        occupied_properties = 0
+        vacant_properties = 0
+        total_tenants = 0
+        pending_alerts = 0
+        for row in counts_result:
+            source = row["_id"].get("source")
+            count = row["count"]
+            if source == "properties":
+                total_properties += count
+                if row["_id"].get("status") == "rented":
+                    occupied_properties = count
+                elif row["_id"].get("status") == "vacant":
+                    vacant_properties = count
+            elif source == "tenants":
+                total_tenants = count
+            elif source == "alerts":
+                pending_alerts = count
         
-        # Get pending alerts
-        pending_alerts = await db.alerts.count_documents({"resolved": False})
+        # Monthly income/expenses and recent transactions
+        facets = transactions_result[0] if transactions_result else {"totals": [], "recent": []}
+        monthly_totals = {row["type"]: row["total"] for row in facets["totals"]}
+        total_monthly_income = monthly_totals.get("income", 0)
+        total_monthly_expenses = monthly_totals.get("expense", 0)
         
-        # Get recent transactions (last 5)
-        recent_transactions_cursor = db.transactions.find({}).sort("created_at", -1).limit(5)
-        recent_transactions = []
-        async for transaction in recent_transactions_cursor:
-            recent_transactions.append(convert_objectid_to_str(transaction))
+        recent_transactions = [
+            convert_objectid_to_str(row["document"]) for row in facets["recent"]
+        ]
         
         return {
             "total_properties": total_properties,
@@ -211,47 +463,60 @@ def create_transaction_filter(
     
     return filter_dict
 
+async def get_tenants_with_rent_paid(db: AsyncIOMotorDatabase, since: datetime) -> set:
+    """Ids of tenants with a rent income transaction dated on or after ``since``"""
+    pipeline = [
+        {
+            "$match": {
+                "type": "income",
+                "date": {"$gte": since},
+                "tenant_id": {"$ne": None},
+                "category": {"$regex": "rent", "$options": "i"}
+            }
+        },
+        {"$group": {"_id": "$tenant_id"}}
+    ]
+    return {row["_id"] async for row in db.transactions.aggregate(pipeline)}
+
 async def generate_automatic_alerts(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
-    """Generate automatic alerts based on system data"""
+    """Generate automatic alerts based on system data
+
+    Payments are resolved with one aggregation over this month's rent income
+    and an in-memory anti-join against the tenants due, instead of one lookup
+    per tenant.
+    """
     alerts = []
     current_date = datetime.now()
     
     try:
         # Rent due alerts
         day_of_month = current_date.day
+        month_start, _ = get_month_range(current_date)
         
-        # Find tenants with rent due today or overdue
-        tenants_cursor = db.tenants.find({
-            "status": "active",
-            "$or": [
-                {"rent_due_date": day_of_month},  # Due today
-                {"rent_due_date": {"$lt": day_of_month}}  # Overdue
-            ]
-        })
+        # Find tenants with rent due today or overdue, and who already paid
+        tenants_cursor = db.tenants.find(
+            {"status": "active", "rent_due_date": {"$lte": day_of_month}},
+            {"_id": 0, "id": 1, "name": 1, "property_id": 1, "rent_due_date": 1}
+        )
+        paid_tenant_ids = await get_tenants_with_rent_paid(db, month_start)
         
         async for tenant in tenants_cursor:
-            # Check if payment was made this month
-            month_start = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            payment_exists = await db.transactions.find_one({
+            if tenant["id"] in paid_tenant_ids:
+                continue
+            
+            is_overdue = tenant["rent_due_date"] < day_of_month
+            alerts.append({
+                "property_id": tenant.get("property_id"),
                 "tenant_id": tenant["id"],
-                "type": "income",
-                "category": {"$regex": "rent", "$options": "i"},
-                "date": {"$gte": month_start}
+                "title": f"{'Overdue' if is_overdue else 'Due'} Rent Payment",
+                "message": f"Rent payment is {'overdue' if is_overdue else 'due'} for tenant {tenant['name']}",
+                "type": "payment_overdue" if is_overdue else "rent_due",
+                "priority": "high" if is_overdue else "medium",
+                "due_date": current_date,
+                "month": month_start.strftime("%Y-%m"),
+                "created_at": current_date,
+                "updated_at": current_date
             })
-            
-            if not payment_exists:
-                is_overdue = tenant["rent_due_date"] < day_of_month
-                alerts.append({
-                    "property_id": tenant.get("property_id"),
-                    "tenant_id": tenant["id"],
-                    "title": f"{'Overdue' if is_overdue else 'Due'} Rent Payment",
-                    "message": f"Rent payment is {'overdue' if is_overdue else 'due'} for tenant {tenant['name']}",
-                    "type": "payment_overdue" if is_overdue else "rent_due",
-                    "priority": "high" if is_overdue else "medium",
-                    "due_date": current_date,
-                    "created_at": current_date,
-                    "updated_at": current_date
-                })
         
         # Contract expiring alerts (next 30 days)
         # This would require contract end dates in tenant model - placeholder for now
@@ -261,4 +526,4 @@ async def generate_automatic_alerts(db: AsyncIOMotorDatabase) -> List[Dict[str,
         
     except Exception as e:
         logger.error("Error generating automatic alerts", error=str(e))
-        return []
\ No newline at end of file
+        return []
@@ -14,11 +14,14 @@ from datetime import datetime
 from backend.config import settings
 from backend.database import connect_to_mongo, close_mongo_connection, get_database
 from backend.models import HealthResponse, DashboardSummary
-from backend.utils import calculate_dashboard_summary
+from backend.rollups import get_dashboard_summary_from_rollups
+from backend.indexes import ensure_indexes
+from backend.migrations import run_migrations
 from backend.auth import get_current_active_user
+from backend.responses import APIJSONResponse
 
 # Router imports
-from backend.routers import auth, properties, tenants
+from backend.routers import auth, properties, tenants, transactions, alerts, admin, energy_bills, water_bills, reports
 
 # Configure structured logging
 structlog.configure(
@@ -48,6 +51,7 @@ app = FastAPI(
     version="3.2.0",
     docs_url="/api/docs" if settings.debug else None,
     redoc_url="/api/redoc" if settings.debug else None,
+    default_response_class=APIJSONResponse,
 )
 
 # CORS configuration
@@ -66,6 +70,10 @@ async def startup_event():
     try:
         logger.info("Starting SISMOBI Backend 3.2.0")
         await connect_to_mongo()
+        if settings.auto_create_indexes:
+            await ensure_indexes(get_database())
+        if settings.auto_run_migrations:
+            await run_migrations(get_database())
         logger.info("SISMOBI Backend started successfully")
     except Exception as e:
         logger.error("Failed to start backend", error=str(e))
@@ -85,6 +93,12 @@ async def shutdown_event():
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(properties.router, prefix="/api/v1")
 app.include_router(tenants.router, prefix="/api/v1")
+app.include_router(transactions.router, prefix="/api/v1")
+app.include_router(alerts.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
+app.include_router(energy_bills.router, prefix="/api/v1")
+app.include_router(water_bills.router, prefix="/api/v1")
+app.include_router(reports.router, prefix="/api/v1")
 
 # Root endpoints
 @app.get("/")
@@ -118,9 +132,9 @@ async def get_dashboard_summary(
     current_user = Depends(get_current_active_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Get dashboard summary statistics"""
+    """Get dashboard summary statistics from the materialized rollups"""
     try:
-        summary_data = await calculate_dashboard_summary(db)
+        summary_data = await get_dashboard_summary_from_rollups(db)
         logger.info("Dashboard summary retrieved", user=current_user.email)
         return DashboardSummary(**summary_data)
     except Exception as e: